@@ -21,7 +21,7 @@ const VIZ = {
   let currentRange = [0, 23];
   dateSlider.noUiSlider.on('update', v => {
     currentRange = v.map(Number);
-    //updateVisuals();
+    updateVisuals();
   });
   
   // Chart.js dual-axis config :contentReference[oaicite:16]{index=16}
@@ -46,79 +46,146 @@ const VIZ = {
     }
   });
   
-  // Load sample data with progress (mbtaviz/dataloader.js style) :contentReference[oaicite:17]{index=17}
-  async function loadData() {
-    const indicator = document.getElementById('loading-indicator');
-    const res = await fetch('https://data.cityofchicago.org/resource/fg6s-gzvg.json?$limit=5000');
-    const reader = res.body.getReader();
-    const contentLength = +res.headers.get('Content-Length');
-    let received = 0, chunks = [];
-    while(true) {
-      const { done, value } = await reader.read();
-      if (done) break;
-      chunks.push(value);
-      received += value.length;
-      indicator.textContent = `Loading… ${Math.floor(100 * received/contentLength)}%`;
+  // Precomputed aggregate bundles (scripts/bundles.py): exact counts over every trip,
+  // sharded by month and start-hour range so the slider only fetches what it needs
+  const BUNDLE_URL = 'bundles/';
+  const USER_TYPES = { Subscriber: 'member', Customer: 'casual' };
+  const bundleCache = new Map();
+
+  function fetchBundle(path) {
+    if (!bundleCache.has(path)) {
+      bundleCache.set(path, fetch(BUNDLE_URL + path).then(r => {
+        if (!r.ok) throw new Error(`${path}: ${r.status}`);
+        return r.json();
+      }));
     }
-    const text = new TextDecoder("utf-8")
-                      .decode(new Uint8Array(chunks.flat()));
-    return JSON.parse(text);
+    return bundleCache.get(path);
   }
-  
+
+  // Parallel column arrays -> row objects
+  function rows(columns) {
+    const keys = Object.keys(columns);
+    return (columns[keys[0]] || []).map((_, i) =>
+      Object.fromEntries(keys.map(k => [k, columns[k][i]])));
+  }
+
   // State
-  let trips = [];
-  
-  // After data loaded, kick off first render
-  loadData().then(data => {
-    trips = data.filter(d=>d.from_latitude && d.to_latitude);
-    document.getElementById('loading-indicator').style.display = 'none';
+  let manifest = null, month = null, hourly = [], stations = null;
+  // Renders overlap while shards load; only the latest one may draw
+  let renderToken = 0;
+  const layers = L.layerGroup().addTo(map);
+
+  async function loadMonth(entry) {
+    const indicator = document.getElementById('loading-indicator');
+    indicator.style.display = '';
+    indicator.textContent = `Loading ${entry.month}…`;
+    month = entry;
+    [hourly, stations] = await Promise.all([
+      fetchBundle(entry.hourly).then(rows),
+      fetchBundle(entry.stations),
+    ]);
+    indicator.style.display = 'none';
+  }
+
+  // After the manifest and the latest month are loaded, kick off first render
+  fetchBundle('manifest.json').then(async m => {
+    manifest = m;
+    const monthSelect = document.getElementById('month');
+    if (monthSelect) {
+      monthSelect.innerHTML = m.months.map(e => `<option>${e.month}</option>`).join('');
+      monthSelect.value = m.months[m.months.length - 1].month;
+      monthSelect.addEventListener('change', async () => {
+        await loadMonth(m.months.find(e => e.month === monthSelect.value));
+        updateVisuals();
+      });
+    }
+    await loadMonth(m.months[m.months.length - 1]);
     updateVisuals();
+  }).catch(e => {
+    document.getElementById('loading-indicator').textContent = `Could not load data: ${e.message}`;
   });
-  
-  function updateVisuals() {
-    if (!trips || trips.length === 0) {
-      // If trips is not initialized, exit the function
+
+  function memberFilter() {
+    const ui = document.getElementById('user-type').value;
+    if (ui === 'All') return () => true;
+    const code = manifest.members.indexOf(USER_TYPES[ui] || ui.toLowerCase());
+    return d => d.member === code;
+  }
+
+  async function updateVisuals() {
+    if (!manifest || !month) {
+      // If the bundles are not loaded yet, exit the function
       return;
     }
-  
-    // Clear existing markers
-    map.eachLayer(l => (l instanceof L.Marker) && map.removeLayer(l));
-  
-    // Filter by time, gender, user type
-    const ui = document.getElementById('user-type').value;
-    const g  = document.getElementById('gender').value;
-    const filtered = trips.filter(d => {
-      const hr = new Date(d.start_time).getHours();
-      if (hr < currentRange[0] || hr > currentRange[1]) return false;
-      if (ui!=='All'   && d.user_type !== ui) return false;
-      if (g!=='All'    && d.gender    !== g) return false;
-      return true;
+    const token = ++renderToken;
+    const [lo, hi] = currentRange.map(Math.round);
+    const inRange = d => d.hour >= lo && d.hour <= hi;
+    const keep = memberFilter();
+
+    // Only the shards overlapping the selected hours are fetched
+    const shards = month.shards.filter(s => s.hours[1] >= lo && s.hours[0] <= hi);
+    const [density, routes] = await Promise.all([
+      Promise.all(shards.map(s => fetchBundle(s.density).then(rows))).then(r => r.flat()),
+      Promise.all(shards.map(s => fetchBundle(s.routes).then(rows))).then(r => r.flat()),
+    ]);
+    if (token !== renderToken) {
+      // A newer slider position or month started rendering while these shards loaded
+      return;
+    }
+
+    // Start-location density, one circle per grid cell
+    layers.clearLayers();
+    const cellSize = manifest.grid.cell;
+    const cells = {};
+    density.filter(d => inRange(d) && keep(d)).forEach(d => {
+      const key = `${d.y},${d.x}`;
+      cells[key] = (cells[key] || 0) + d.trips;
     });
-  
-    // Animate each trip as a moving marker
-    filtered.forEach(d => {
-      const from = [ +d.from_latitude, +d.from_longitude ];
-      const to   = [ +d.to_latitude,   +d.to_longitude ];
-      const m = L.movingMarker([ from, to ], [ d.trip_duration*1000 ], {
-        icon: L.divIcon({ className: 'bike-icon' })
-      }).addTo(map);
-      m.on('end', () => map.removeLayer(m));
-      m.start();
+    const maxCell = Math.max(1, ...Object.values(cells));
+    Object.entries(cells).forEach(([key, trips]) => {
+      const [y, x] = key.split(',').map(Number);
+      L.circleMarker([(y + 0.5) * cellSize, (x + 0.5) * cellSize], {
+        radius: 3 + 12 * Math.sqrt(trips / maxCell), stroke: false, fillOpacity: 0.5
+      }).bindTooltip(`${trips.toLocaleString()} trips`).addTo(layers);
     });
-  
+
+    // Busiest routes over the selected hours (sums of the per-hour top routes)
+    const routeTrips = {};
+    routes.filter(d => inRange(d) && keep(d)).forEach(d => {
+      const key = `${d.start},${d.end}`;
+      routeTrips[key] = (routeTrips[key] || 0) + d.trips;
+    });
+    Object.entries(routeTrips).sort((a, b) => b[1] - a[1]).slice(0, 10).forEach(([key, trips]) => {
+      const [from, to] = key.split(',').map(Number);
+      L.polyline([[stations.lat[from], stations.lng[from]], [stations.lat[to], stations.lng[to]]], {
+        weight: 2, color: '#e76f51'
+      }).bindTooltip(`${stations.name[from]} → ${stations.name[to]}: ${trips.toLocaleString()} trips`)
+        .addTo(layers);
+    });
+
     // Aggregate for chart
-    const counts = {}, durations = {};
-    filtered.forEach(d => {
-      const h = new Date(d.start_time).getHours();
-      counts[h] = (counts[h]||0) + 1;
-      durations[h] = (durations[h]||0) + +d.trip_duration;
+    // Mean durations cover only valid durations, so they weigh by duration_count
+    const counts = {}, durations = {}, timed = {};
+    hourly.filter(d => inRange(d) && keep(d)).forEach(d => {
+      counts[d.hour] = (counts[d.hour] || 0) + d.trips;
+      durations[d.hour] = (durations[d.hour] || 0) + d.avg_duration_s * d.duration_count;
+      timed[d.hour] = (timed[d.hour] || 0) + d.duration_count;
     });
     const hours = Array.from({length:24}, (_,i)=>i);
     tripChart.data.labels = hours.map(h=>`${h}:00`);
     tripChart.data.datasets[0].data = hours.map(h=>counts[h]||0);
     tripChart.data.datasets[1].data = hours.map(h=> {
-      const c = counts[h]||1;
+      const c = timed[h]||1;
       return Math.round((durations[h]||0)/c);
     });
     tripChart.update();
-  }
\ No newline at end of file
+  }
+
+  document.getElementById('user-type').addEventListener('change', updateVisuals);
+
+  // The bundles carry no gender (the current trip data dropped it), so the control is disabled
+  const genderSelect = document.getElementById('gender');
+  if (genderSelect) {
+    genderSelect.disabled = true;
+    genderSelect.title = 'Gender is not in the current Divvy trip data';
+  }
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import date
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+
+import catalog
+import metrics
+from chart_cache import LRUCache
+from queries import TripQueries
+
+# -----------------------
+# Headless Analytics API
+# -----------------------
+# Serves the dashboard aggregates as JSON. Responses are cached per
+# (endpoint, parameters, dataset version) and shared by every client; concurrent
+# requests for the same key wait on a single computation. Each body carries a
+# content ETag so unchanged results revalidate with 304 Not Modified.
+#
+#   uvicorn api:app --app-dir scripts
+RESPONSE_CACHE_SIZE = 512
+MAX_AGE = int(os.environ.get('DIVVY_API_MAX_AGE', 300))
+
+queries = TripQueries(os.environ.get('DIVVY_DATA_SOURCE', catalog.DATA_DIR))
+responses = LRUCache(RESPONSE_CACHE_SIZE)
+registry = metrics.Registry()
+_inflight = {}
+
+app = FastAPI(title="Divvy Trip Analytics")
+
+
+def parse_members(members):
+    if not members:
+        return None
+    selected = tuple(sorted({m.strip() for m in members.split(',') if m.strip()}))
+    unknown = set(selected) - {'casual', 'member'}
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"unknown members: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def parse_range(start, end):
+    if start and end and start > end:
+        raise HTTPException(status_code=422, detail="start must not be after end")
+    return (start, end)
+
+
+def _encode(records):
+    body = json.dumps(records, separators=(',', ':'), default=str).encode()
+    return body, '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+
+async def cached(name, compute, members, date_range, **params):
+    # Resolve once so the cache key carries the dataset version of the selected partitions
+    try:
+        members, date_range, selected = await run_in_threadpool(queries.resolve, members, date_range)
+    except LookupError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    key = (name, members, date_range, tuple(sorted(params.items())), queries.version(selected))
+    if key not in _inflight:
+        _inflight[key] = asyncio.ensure_future(run_in_threadpool(timed, name, key, lambda: _encode(
+            compute(members=members, date_range=date_range, **params))))
+        _inflight[key].add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(_inflight[key])
+
+
+def timed(name, key, compute):
+    recorder = metrics.Recorder(registry)
+    with recorder.span(name, 'endpoint'):
+        body, hit = responses.lookup(key, compute)
+        recorder.lookup(hit)
+    return body
+
+
+def etag_matches(if_none_match, etag):
+    # "*" or a comma-separated list of entity tags, compared weakly (W/ prefix ignored)
+    tags = [tag.strip() for tag in (if_none_match or '').split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def respond(request, body, etag):
+    headers = {'ETag': etag, 'Cache-Control': f"public, max-age={MAX_AGE}"}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+async def endpoint(request, name, compute, members, start, end, **params):
+    body, etag = await cached(name, compute, parse_members(members), parse_range(start, end), **params)
+    return respond(request, body, etag)
+
+
+# -------- Overview --------
+@app.get("/api/trip-counts")
+async def trip_counts(request: Request, members: str = None, start: date = None, end: date = None):
+    return await endpoint(request, 'trip_counts', queries.trip_counts, members, start, end)
+
+
+@app.get("/api/avg-duration")
+async def avg_duration(request: Request, members: str = None, start: date = None, end: date = None):
+    return await endpoint(request, 'avg_duration', queries.avg_duration, members, start, end)
+
+
+@app.get("/api/day-night")
+async def day_night(request: Request, members: str = None, start: date = None, end: date = None):
+    return await endpoint(request, 'day_night', queries.day_night, members, start, end)
+
+
+# -------- Patterns --------
+@app.get("/api/weekly")
+async def weekly(request: Request, members: str = None, start: date = None, end: date = None):
+    return await endpoint(request, 'weekly', queries.weekly, members, start, end)
+
+
+@app.get("/api/hourly")
+async def hourly(request: Request, members: str = None, start: date = None, end: date = None):
+    return await endpoint(request, 'hourly', queries.hourly, members, start, end)
+
+
+@app.get("/api/hourly-stats")
+async def hourly_stats(request: Request, members: str = None, start: date = None, end: date = None):
+    return await endpoint(request, 'hourly_stats', queries.hourly_stats, members, start, end)
+
+
+# -------- Durations and Routes --------
+@app.get("/api/duration-histogram")
+async def duration_histogram(request: Request, members: str = None, start: date = None, end: date = None,
+                             max_minutes: int = Query(120, ge=1, le=180), width: float = Query(4, gt=0)):
+    return await endpoint(request, 'duration_histogram', queries.duration_histogram, members, start, end,
+                          max_minutes=max_minutes, width=width)
+
+
+@app.get("/api/duration-box")
+async def duration_box(request: Request, members: str = None, start: date = None, end: date = None):
+    return await endpoint(request, 'duration_box', queries.duration_box, members, start, end)
+
+
+@app.get("/api/top-routes")
+async def top_routes(request: Request, members: str = None, start: date = None, end: date = None,
+                     n: int = Query(15, ge=1, le=200)):
+    return await endpoint(request, 'top_routes', queries.top_routes, members, start, end, n=n)
+
+
+# -------- Map --------
+@app.get("/api/density")
+async def density(request: Request, members: str = None, start: date = None, end: date = None,
+                  level: str = Query('medium', pattern='^(coarse|medium|fine|street)$'),
+                  endpoint_: str = Query('start', alias='endpoint', pattern='^(start|end)$')):
+    return await endpoint(request, 'density', queries.start_density, members, start, end,
+                          level=level, endpoint=endpoint_)
+
+
+# -------- Data Quality --------
+@app.get("/api/quality")
+async def data_quality(request: Request, start: date = None, end: date = None):
+    return await endpoint(request, 'quality', queries.quality, None, start, end)
+
+
+# -------- Station Flows --------
+@app.get("/api/flows")
+async def station_flows(request: Request, start: date = None, end: date = None, station: str = None):
+    try:
+        return await endpoint(request, 'station_flows', queries.station_flows, None, start, end, station=station)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown station: {station}")
+
+
+# -------- Demand Prediction --------
+@app.get("/api/demand/forecast")
+async def demand_forecast(request: Request, hours: int = Query(24, ge=1, le=24 * 14), station: str = None):
+    try:
+        return await endpoint(request, 'demand_forecast', queries.demand_forecast, None, None, None,
+                              hours=hours, station=station)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown station: {station}")
+
+
+@app.get("/api/demand/stations")
+async def demand_stations(request: Request, hours: int = Query(24, ge=1, le=24 * 14),
+                          n: int = Query(15, ge=1, le=500)):
+    return await endpoint(request, 'demand_stations', queries.demand_stations, None, None, None,
+                          hours=hours, n=n)
+
+
+@app.get("/api/partitions")
+async def partitions():
+    listed = await run_in_threadpool(queries.partitions)
+    return [{'name': p.name, 'start': str(p.start), 'end': str(p.end), 'rows': catalog.partition_rows(p)}
+            for p in listed]
+
+
+@app.get("/api/cache")
+async def cache_stats():
+    return responses.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
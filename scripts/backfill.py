@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pyarrow.parquet as pq
+
+import catalog
+import ingest
+
+# -----------------------
+# Parallel Backfill: python backfill.py [<data_dir>] [--workers N] [--chunk-rows N] [--force]
+# -----------------------
+# Ingests every monthly CSV in a data directory across a process pool. Each worker
+# parses its file in chunks (ingest.ingest_csv_chunked), so per-worker memory is
+# bounded by --chunk-rows rather than by the size of the month, and writes that
+# month's Parquet partition with the derived columns. Files whose partition is
+# already current are skipped unless --force is given.
+WORKERS = max((os.cpu_count() or 2) - 1, 1)
+
+
+def ingest_file(csv_path, chunk_rows=ingest.CHUNK_ROWS):
+    start = time.perf_counter()
+    parquet_path = ingest.ingest_csv_chunked(csv_path, chunk_rows=chunk_rows)
+    return {
+        'file': os.path.basename(csv_path),
+        'rows': pq.ParquetFile(parquet_path).metadata.num_rows,
+        'mb': os.path.getsize(csv_path) / 2 ** 20,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def pending_files(data_dir, force=False):
+    paths = [os.path.join(data_dir, f) for f in sorted(os.listdir(data_dir)) if catalog.FILE_PATTERN.match(f)]
+    if force:
+        return paths
+    return [p for p in paths if ingest.is_stale(p, ingest.parquet_path_for(p))]
+
+
+def backfill(paths, workers=WORKERS, chunk_rows=ingest.CHUNK_ROWS, report=print):
+    # Largest files first so a long month does not start last and stall the pool
+    paths = sorted(paths, key=os.path.getsize, reverse=True)
+    results, failures = [], []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(ingest_file, path, chunk_rows): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                r = future.result()
+            except Exception as e:
+                failures.append((futures[future], e))
+                report(f"{os.path.basename(futures[future]):<32} FAILED: {e}")
+                continue
+            results.append(r)
+            report(f"{r['file']:<32} {r['rows']:>11,} rows {r['mb']:>9.1f} MB {r['seconds']:>8.2f}s "
+                   f"{r['rows'] / r['seconds']:>12,.0f} rows/s {r['mb'] / r['seconds']:>7.1f} MB/s")
+    elapsed = time.perf_counter() - start
+    if results:
+        rows = sum(r['rows'] for r in results)
+        mb = sum(r['mb'] for r in results)
+        report(f"{len(results)} files, {rows:,} rows, {mb:.1f} MB in {elapsed:.2f}s with {workers} workers: "
+               f"{rows / elapsed:,.0f} rows/s, {mb / elapsed:.1f} MB/s")
+    return results, failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingest monthly Divvy CSVs into Parquet in parallel")
+    parser.add_argument('data_dir', nargs='?', default=catalog.DATA_DIR)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--chunk-rows', type=int, default=ingest.CHUNK_ROWS,
+                        help="rows parsed at a time per worker (bounds worker memory)")
+    parser.add_argument('--force', action='store_true', help="re-ingest files whose Parquet is current")
+    args = parser.parse_args()
+
+    paths = pending_files(args.data_dir, args.force)
+    if not paths:
+        print(f"Nothing to ingest in {args.data_dir}")
+        sys.exit(0)
+    _, failures = backfill(paths, args.workers, args.chunk_rows)
+    sys.exit(1 if failures else 0)
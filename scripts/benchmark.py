@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+import catalog
+import cube
+import demand
+import durations
+import engine
+import figures
+import filters
+import flows
+import ingest
+import sampling
+import spatial
+
+# -----------------------
+# Benchmark Suite: python benchmark.py --sizes 100k,1M [--output [path]] [--compare [path]]
+# -----------------------
+# Generates synthetic Divvy-schema monthly CSVs, then times every stage the
+# dashboards run (ingest, load_data, filtering, and each panel's aggregates and
+# figures) headlessly on the chosen query engines (--engines pandas,duckdb), so
+# the eager and out-of-core paths can be compared. Each size and engine runs in a
+# fresh process so peak RSS is its own.
+# Wall time is the best of --repeat runs; one more run under tracemalloc records
+# allocations.
+SIZES = '100k,1M'
+ENGINES = 'pandas'
+MONTHS = 3
+FIRST_MONTH = (2020, 4)
+SEED = 7
+N_STATIONS = 600
+POPULARITY_SKEW = 1.0
+REGRESSION_TOLERANCE = 0.2
+# Differences below this are timer noise, whatever the ratio
+REGRESSION_FLOOR_S = 0.01
+REPEAT = 3
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+# -------- Synthetic Data --------
+def synth_trips(n, year, month, seed=SEED):
+    rng = np.random.default_rng([seed, year, month, n])
+    station_rng = np.random.default_rng(seed)
+    names = np.array([f"Station {i}" for i in range(N_STATIONS)], dtype=object)
+    station_lat = 41.88 + station_rng.normal(0, 0.06, N_STATIONS)
+    station_lng = -87.64 + station_rng.normal(0, 0.04, N_STATIONS)
+    # Busy downtown stations get more trips, but popularity falls off only as
+    # 1 / rank ** POPULARITY_SKEW, so every station and most routes still see trips
+    popularity = 1 / station_rng.permutation(np.arange(1, N_STATIONS + 1)) ** POPULARITY_SKEW
+    popularity /= popularity.sum()
+    start, end = catalog.month_bounds(year, month)
+    days = (end - start).days + 1
+    hour_weights = np.array([1, 1, 1, 1, 1, 2, 4, 7, 9, 6, 5, 6, 7, 7, 7, 8, 10, 12, 10, 7, 5, 4, 3, 2],
+                            dtype='float64')
+    seconds = (rng.integers(0, days, n) * 86400 +
+               rng.choice(24, n, p=hour_weights / hour_weights.sum()) * 3600 +
+               rng.integers(0, 3600, n))
+    started = pd.Timestamp(start) + pd.to_timedelta(seconds, unit='s')
+    minutes = rng.lognormal(2.5, 0.8, n)
+    minutes[rng.random(n) < 0.002] *= -0.1
+    ended = started + pd.to_timedelta(minutes * 60, unit='s')
+    s_ids = rng.choice(N_STATIONS, n, p=popularity)
+    e_ids = rng.choice(N_STATIONS, n, p=popularity)
+    s_names, e_names = names[s_ids], names[e_ids]
+    s_names[rng.random(n) < 0.05] = None
+    e_names[rng.random(n) < 0.05] = None
+    return pd.DataFrame({
+        'ride_id': pd.Series(rng.integers(0, 2 ** 63, n)).map('{:016X}'.format),
+        'rideable_type': rng.choice(['classic_bike', 'electric_bike', 'docked_bike'], n),
+        'started_at': started.strftime('%Y-%m-%d %H:%M:%S'),
+        'ended_at': ended.strftime('%Y-%m-%d %H:%M:%S'),
+        'start_station_name': s_names,
+        'start_station_id': s_ids.astype(str),
+        'end_station_name': e_names,
+        'end_station_id': e_ids.astype(str),
+        'start_lat': (station_lat[s_ids] + rng.normal(0, 0.0005, n)).round(6),
+        'start_lng': (station_lng[s_ids] + rng.normal(0, 0.0005, n)).round(6),
+        'end_lat': (station_lat[e_ids] + rng.normal(0, 0.0005, n)).round(6),
+        'end_lng': (station_lng[e_ids] + rng.normal(0, 0.0005, n)).round(6),
+        'member_casual': rng.choice(['member', 'casual'], n, p=[0.6, 0.4]),
+    })
+
+
+def write_dataset(n, work_dir, months=MONTHS, seed=SEED):
+    # Generated once per (rows, months, seed) and reused by later runs
+    data_dir = os.path.join(work_dir, f"{n}-{months}-{seed}")
+    done = os.path.join(data_dir, '.complete')
+    if not os.path.exists(done):
+        os.makedirs(data_dir, exist_ok=True)
+        year, month = FIRST_MONTH
+        for i, rows in enumerate(np.array_split(np.arange(n), months)):
+            m = month - 1 + i
+            y, m = year + m // 12, m % 12 + 1
+            synth_trips(len(rows), y, m, seed).to_csv(
+                os.path.join(data_dir, ingest.MONTH_FILE.format(year=y, month=m)), index=False)
+        open(done, 'w').close()
+    return data_dir
+
+
+# -------- Stages (mirror the dashboard panels) --------
+def stage_ingest(state):
+    for fname in sorted(os.listdir(state['data_dir'])):
+        if catalog.FILE_PATTERN.match(fname):
+            ingest.ingest_csv(os.path.join(state['data_dir'], fname))
+
+
+def stage_load_data(state):
+    # The middle month for one user type is the selection every later stage filters to
+    state['partitions'] = catalog.discover(state['data_dir'])
+    middle = state['partitions'][len(state['partitions']) // 2]
+    state['members'], state['date_range'] = ('member',), (middle.start, middle.end)
+    if state['engine'].name == 'pandas':
+        state['frames'] = {p: catalog.load_partition(p) for p in state['partitions']}
+        state['df'] = catalog.concat_trips(list(state['frames'].values()))
+
+
+def stage_index(state):
+    state['index'] = filters.build_index(state['df'])
+
+
+def stage_filter(state):
+    # The filtered_df selection of the dashboards
+    state['rows'] = filters.filter_rows(state['index'], state['members'], state['date_range'])
+    state['filtered_df'] = state['df'].iloc[state['rows']]
+
+
+def stage_overview(state):
+    sample = sampling.merge_samples([state['engine'].sample(p) for p in state['partitions']])
+    sample = filters.filter_trips(sample, filters.build_index(sample), state['members'], state['date_range'])
+    state['overview'] = (sampling.weighted_counts(sample, ['member_casual']),
+                         sampling.weighted_mean(sample, 'ride_duration', ['member_casual']))
+
+
+def stage_patterns(state):
+    trips = cube.slice_cube(cube.concat_cubes([state['engine'].cube(p) for p in state['partitions']]),
+                            state['members'], state['date_range'])
+    state['cube'] = trips
+    state['patterns'] = (cube.by_day_of_week(trips), cube.by_hour(trips), cube.by_day_night(trips))
+
+
+def stage_durations(state):
+    summary = durations.slice_summary(
+        durations.concat_summaries([state['engine'].durations(p) for p in state['partitions']]),
+        state['members'], state['date_range'])
+    state['durations'] = (durations.histogram(summary, ['member_casual'], 120, 2),
+                          durations.box_stats(summary, ['time_of_day', 'member_casual'], 180))
+
+
+def stage_routes(state):
+    state['routes'] = state['engine'].top_routes(tuple(state['partitions']), state['members'],
+                                                 state['date_range'], 15)
+
+
+def stage_map(state):
+    grid = spatial.concat_grids([state['engine'].grid(p) for p in state['partitions']])
+    state['map'] = spatial.density(grid, state['members'], state['date_range'], 'fine', 'start')
+
+
+def stage_flows(state):
+    station_flows = flows.select_flows([state['engine'].flows(p) for p in state['partitions']],
+                                       state['date_range'])
+    state['flows'] = flows.summary(station_flows)
+
+
+def stage_demand(state):
+    model = demand.fit([state['engine'].demand(p) for p in state['partitions']])
+    state['demand'] = (demand.citywide(model, 168), demand.top_stations(model, 24))
+
+
+def stage_figures(state):
+    dow, hourly, _ = state['patterns']
+    hist, _ = state['durations']
+    built = [
+        px.bar(dow, x='day_of_week', y='count', color='member_casual', barmode='group'),
+        px.line(hourly, x='start_hour', y='count', color='member_casual', markers=True),
+        px.line(hist, x='bin_center', y='count', color='member_casual'),
+        px.bar(state['routes'], x='count', y='route', orientation='h'),
+    ]
+    state['payload_bytes'] = sum(len(figures.to_payload(figures.prepare(fig))) for fig in built)
+
+
+# Stages that only exist on the eager pandas path
+PANDAS_STAGES = {'index', 'filter'}
+STAGES = [
+    ('ingest', stage_ingest),
+    ('load_data', stage_load_data),
+    ('index', stage_index),
+    ('filter', stage_filter),
+    ('overview', stage_overview),
+    ('patterns', stage_patterns),
+    ('durations', stage_durations),
+    ('routes', stage_routes),
+    ('map', stage_map),
+    ('flows', stage_flows),
+    ('demand', stage_demand),
+    ('figures', stage_figures),
+]
+
+
+# -------- Measurement --------
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def run_size(n, work_dir, months=MONTHS, seed=SEED, allocations=True, repeat=REPEAT, engine_name='pandas'):
+    state = {'data_dir': write_dataset(n, work_dir, months, seed)}
+    state['engine'] = engine.get_engine(engine_name, frames=lambda p: state['frames'][p])
+    results = []
+    for name, stage in STAGES:
+        if engine_name != 'pandas' and name in PANDAS_STAGES:
+            continue
+        wall = float('inf')
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            stage(state)
+            wall = min(wall, time.perf_counter() - start)
+        record = {'engine': engine_name, 'rows': n, 'stage': name, 'wall_s': round(wall, 4), 'peak_rss_mb': peak_rss_mb()}
+        if allocations:
+            tracemalloc.start()
+            stage(state)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            record['alloc_peak_mb'] = round(peak / 2 ** 20, 2)
+            record['alloc_retained_mb'] = round(current / 2 ** 20, 2)
+        results.append(record)
+        print(f"{engine_name:<7}{n:>12,} {name:<10} {wall:9.3f}s  rss {record['peak_rss_mb']:>8} MB"
+              + (f"  alloc {record['alloc_peak_mb']:>8} MB" if allocations else ''), flush=True)
+    return results
+
+
+def environment(engines):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    try:
+        import duckdb
+        duckdb_version = duckdb.__version__
+    except ImportError:
+        duckdb_version = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'duckdb': duckdb_version,
+        'engines': engines,
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    # Wall-time ratios against a baseline; returns the stages slower than the tolerance
+    base = {(r.get('engine', 'pandas'), r['rows'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = base.get((r['engine'], r['rows'], r['stage']))
+        if not old or not old['wall_s']:
+            continue
+        ratio = r['wall_s'] / old['wall_s']
+        slower = ratio > 1 + tolerance and r['wall_s'] - old['wall_s'] > REGRESSION_FLOOR_S
+        flag = ' REGRESSION' if slower else ''
+        print(f"{r['engine']:<7}{r['rows']:>12,} {r['stage']:<10} {old['wall_s']:9.3f}s -> {r['wall_s']:9.3f}s "
+              f"({ratio:5.2f}x){flag}")
+        if flag:
+            regressions.append((r['engine'], r['rows'], r['stage'], round(ratio, 2)))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard computations on synthetic trips")
+    parser.add_argument('--sizes', default=SIZES, help="comma-separated row counts, e.g. 100k,1M,10M,50M")
+    parser.add_argument('--engines', default=ENGINES, help="comma-separated query engines: pandas,duckdb")
+    parser.add_argument('--months', type=int, default=MONTHS)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'divvy-benchmark'))
+    parser.add_argument('--output', nargs='?', const=BASELINE, help="write results JSON (default: the baseline)")
+    parser.add_argument('--compare', nargs='?', const=BASELINE, help="compare wall times against a baseline JSON")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="timed runs per stage (best is kept)")
+    parser.add_argument('--no-allocations', action='store_true', help="skip the tracemalloc pass")
+    args = parser.parse_args()
+
+    results = []
+    for n in (parse_size(s) for s in args.sizes.split(',')):
+        for engine_name in args.engines.split(','):
+            # A fresh process per run keeps peak RSS from carrying over
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                results += pool.submit(run_size, n, args.work_dir, args.months, args.seed,
+                                       not args.no_allocations, args.repeat, engine_name).result()
+
+    report = {'environment': environment(args.engines.split(',')), 'months': args.months, 'seed': args.seed,
+              'repeat': args.repeat, 'results': results}
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results -> {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
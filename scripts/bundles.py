@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import catalog
+import cube
+import quality
+import spatial
+import stations
+
+# -----------------------
+# Static Aggregate Bundles: python bundles.py [<data_dir>] [--out <dir>] [--hour-step N]
+# -----------------------
+# Exports the dashboard aggregates over every trip as compact columnar JSON for the
+# static site (script.js and the React pages), one directory per month:
+#   manifest.json                  months, shard index, member and grid dictionaries
+#   <YYYY-MM>/hourly.json          trips, mean duration and the trips it averages per start
+#                                  hour and user type
+#   <YYYY-MM>/stations.json        station names and coordinates (route ids index these)
+#   <YYYY-MM>/density-HH-HH.json   start-location grid cells per hour and user type
+#   <YYYY-MM>/routes-HH-HH.json    top routes per hour and user type
+# Density and route shards each cover --hour-step start hours, so an hour slider only
+# fetches the shards it overlaps. Columns are parallel arrays of small integers (grid
+# cell indices, dictionary codes, station ids), which gzip and brotli compress well.
+# Months whose dataset version is unchanged since the last export are skipped.
+BUNDLE_DIR = os.environ.get(
+    'DIVVY_BUNDLE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'bundles'),
+)
+BUNDLE_FORMAT = 2
+HOUR_STEP = 4
+GRID_LEVEL = 'fine'
+TOP_ROUTES = 100
+MEMBERS = ['casual', 'member']
+
+
+def month_groups(partitions):
+    # A month's base file and its delta segments export together
+    months = {}
+    for p in partitions:
+        months.setdefault(f"{p.name[:4]}-{p.name[4:6]}", []).append(p)
+    return months
+
+
+def hour_ranges(step):
+    return [(h, min(h + step, 24) - 1) for h in range(0, 24, step)]
+
+
+def _member_codes(df):
+    return pd.Categorical(df['member_casual'], categories=MEMBERS).codes
+
+
+def hourly_table(df):
+    # Mean durations come from the cube, so they skip durations flagged at ingest; clients
+    # combine them weighted by duration_count, not trips
+    hourly = cube.rollup(cube.build_cube(df), ['start_hour', 'member_casual'])
+    hourly = hourly[hourly['member_casual'].isin(MEMBERS)]
+    hourly = hourly.assign(member=_member_codes(hourly)).sort_values(['start_hour', 'member'])
+    return {
+        'hour': hourly['start_hour'].astype(int).tolist(),
+        'member': hourly['member'].astype(int).tolist(),
+        'trips': hourly['count'].astype(int).tolist(),
+        'avg_duration_s': (hourly['mean_duration'] * 60).round().fillna(0).astype(int).tolist(),
+        'duration_count': hourly['duration_count'].astype(int).tolist(),
+    }
+
+
+def density_cells(df, level=GRID_LEVEL):
+    size = spatial.GRID_LEVELS[level]
+    codes = _member_codes(df)
+    valid = quality.valid(df['quality'], quality.START_OFF_MAP) & (df['start_hour'].to_numpy() >= 0) & (codes >= 0)
+    cells = pd.DataFrame({
+        'hour': df['start_hour'].to_numpy()[valid],
+        'member': codes[valid],
+        'y': np.floor(df['start_lat'].to_numpy('float64')[valid] / size).astype('int32'),
+        'x': np.floor(df['start_lng'].to_numpy('float64')[valid] / size).astype('int32'),
+    })
+    return cells.groupby(['hour', 'member', 'y', 'x']).size().reset_index(name='trips')
+
+
+def route_counts(df, index, n=TOP_ROUTES):
+    # Exact top-n routes for every (start hour, user type)
+    hours = df['start_hour'].to_numpy()
+    codes = _member_codes(df)
+    names = pd.Index(index.stations['name'])
+    tables = []
+    for hour in range(24):
+        for member in range(len(MEMBERS)):
+            rows = np.flatnonzero((hours == hour) & (codes == member))
+            top = stations.top_routes(stations.od_matrix(index, rows), index.stations, n)
+            tables.append(pd.DataFrame({
+                'hour': hour, 'member': member,
+                'start': names.get_indexer(top['start_station_name']),
+                'end': names.get_indexer(top['end_station_name']),
+                'trips': top['count'].astype(int).to_numpy(),
+            }))
+    return pd.concat(tables, ignore_index=True)
+
+
+def _columns(frame):
+    return {column: frame[column].astype(int).tolist() for column in frame.columns}
+
+
+def _write(out_dir, name, payload):
+    path = os.path.join(out_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    with open(path + '.tmp', 'wb') as f:
+        f.write(body)
+    os.replace(path + '.tmp', path)
+    return len(body)
+
+
+def export_month(month, parts, out_dir, hour_step=HOUR_STEP, level=GRID_LEVEL, n_routes=TOP_ROUTES):
+    frames = [catalog.load_partition(p) for p in parts]
+    df = catalog.concat_trips(frames)
+    index = stations.merge_station_indexes([stations.build_station_index(f) for f in frames],
+                                           catalog.merge_order(frames))
+    # Rebuild the month's directory so shards of an older --hour-step do not linger
+    shutil.rmtree(os.path.join(out_dir, month), ignore_errors=True)
+    sizes = {
+        'hourly': _write(out_dir, f"{month}/hourly.json", hourly_table(df)),
+        'stations': _write(out_dir, f"{month}/stations.json", {
+            'name': index.stations['name'].tolist(),
+            'lat': index.stations['lat'].round(5).fillna(0).tolist(),
+            'lng': index.stations['lng'].round(5).fillna(0).tolist(),
+        }),
+    }
+    cells = density_cells(df, level)
+    routes = route_counts(df, index, n_routes)
+    shards = []
+    for lo, hi in hour_ranges(hour_step):
+        shard = {'hours': [lo, hi],
+                 'density': f"{month}/density-{lo:02d}-{hi:02d}.json",
+                 'routes': f"{month}/routes-{lo:02d}-{hi:02d}.json"}
+        sizes[shard['density']] = _write(out_dir, shard['density'],
+                                         _columns(cells[cells['hour'].between(lo, hi)]))
+        sizes[shard['routes']] = _write(out_dir, shard['routes'],
+                                        _columns(routes[routes['hour'].between(lo, hi)]))
+        shards.append(shard)
+    first_day, last_day = catalog.full_range(parts)
+    entry = {
+        'month': month,
+        'version': catalog.dataset_version(parts),
+        'trips': int(len(df)),
+        'start': str(first_day),
+        'end': str(last_day),
+        'hourly': f"{month}/hourly.json",
+        'stations': f"{month}/stations.json",
+        'shards': shards,
+    }
+    return entry, sum(sizes.values())
+
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export(partitions, out_dir=BUNDLE_DIR, hour_step=HOUR_STEP, level=GRID_LEVEL, n_routes=TOP_ROUTES,
+           force=False, report=print):
+    settings = {'format': BUNDLE_FORMAT, 'hour_step': hour_step,
+                'grid': {'level': level, 'cell': spatial.GRID_LEVELS[level]},
+                'members': MEMBERS, 'top_routes': n_routes}
+    previous = read_manifest(out_dir) or {}
+    reusable = {} if force or any(previous.get(k) != v for k, v in settings.items()) else \
+        {m['month']: m for m in previous.get('months', [])}
+    months = []
+    for month, parts in sorted(month_groups(partitions).items()):
+        old = reusable.get(month)
+        if old and old['version'] == catalog.dataset_version(parts):
+            months.append(old)
+            continue
+        entry, size = export_month(month, parts, out_dir, hour_step, level, n_routes)
+        report(f"{month}: {entry['trips']:,} trips -> {len(entry['shards'])} shards, {size / 1024:,.1f} KB")
+        months.append(entry)
+    # Months no longer in the catalog are dropped from the bundle
+    for stale in set(m['month'] for m in previous.get('months', [])) - set(m['month'] for m in months):
+        shutil.rmtree(os.path.join(out_dir, stale), ignore_errors=True)
+    _write(out_dir, 'manifest.json', {**settings, 'months': months})
+    return months
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export dashboard aggregates as static JSON bundles")
+    parser.add_argument('data_dir', nargs='?', default=catalog.DATA_DIR)
+    parser.add_argument('--out', default=BUNDLE_DIR)
+    parser.add_argument('--hour-step', type=int, default=HOUR_STEP, help="start hours per shard")
+    parser.add_argument('--level', default=GRID_LEVEL, choices=list(spatial.GRID_LEVELS))
+    parser.add_argument('--top-routes', type=int, default=TOP_ROUTES, help="routes kept per hour and user type")
+    parser.add_argument('--force', action='store_true', help="re-export months that are unchanged")
+    args = parser.parse_args()
+
+    export(catalog.discover(args.data_dir), args.out, args.hour_step, args.level, args.top_routes, args.force)
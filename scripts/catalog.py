@@ -0,0 +1,220 @@
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import quality
+from ingest import (ingest_csv, is_stale, parquet_path_for, read_segment, read_trips,
+                    refresh_segment, segment_is_stale)
+
+# -----------------------
+# Monthly Partition Catalog
+# -----------------------
+DATA_DIR = os.environ.get(
+    'DIVVY_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'data_files'),
+)
+FILE_PATTERN = re.compile(r'^(\d{4})(\d{2})-divvy-tripdata\.csv$')
+DELTA_PATTERN = re.compile(r'^(\d{4})(\d{2})-divvy-tripdata\.delta-(\d+)\.parquet$')
+
+
+# Discovery only stats the monthly CSVs (name, size, mtime) and reads the footers of
+# delta segments, which are written already ingested. A missing or stale cache is
+# ingested when the partition is first loaded (load_partition, parquet_file), never
+# while listing the directory, so a partition's identity does not change on ingest.
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    csv_path: str   # the month's CSV, or the Parquet file of an appended delta segment
+    start: date
+    end: date
+    size: int
+    mtime: float
+    segment: int = 0
+
+
+def month_bounds(year, month):
+    start = date(year, month, 1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def started_at_bounds(parquet_file):
+    # Row-group statistics give the exact date range without reading any data
+    lo, hi = None, None
+    col = parquet_file.schema_arrow.get_field_index('started_at')
+    for i in range(parquet_file.metadata.num_row_groups):
+        stats = parquet_file.metadata.row_group(i).column(col).statistics
+        if stats is None or not stats.has_min_max:
+            return None
+        lo = stats.min if lo is None else min(lo, stats.min)
+        hi = stats.max if hi is None else max(hi, stats.max)
+    if lo is None:
+        return None
+    return pd.Timestamp(lo).date(), pd.Timestamp(hi).date()
+
+
+def describe_partition(csv_path, year, month):
+    start, end = month_bounds(year, month)
+    stat = os.stat(csv_path)
+    return Partition(
+        name=f"{year:04d}{month:02d}",
+        csv_path=csv_path,
+        start=start,
+        end=end,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+    )
+
+
+def describe_segment(parquet_path, year, month, segment):
+    parquet_file = pq.ParquetFile(parquet_path)
+    if not parquet_file.metadata.num_rows:
+        # Retired: every trip in it arrived again with the full monthly CSV
+        return None
+    bounds = started_at_bounds(parquet_file) or month_bounds(year, month)
+    stat = os.stat(parquet_path)
+    # Ingesting a newer monthly CSV retires rows from its deltas (ingest.retire_deltas),
+    # so a segment also changes identity when its month's CSV does
+    base_csv = parquet_path.rsplit('.delta-', 1)[0] + '.csv'
+    mtime = max(stat.st_mtime, os.path.getmtime(base_csv)) if os.path.exists(base_csv) else stat.st_mtime
+    return Partition(
+        name=f"{year:04d}{month:02d}.{segment:04d}",
+        csv_path=parquet_path,
+        start=bounds[0],
+        end=bounds[1],
+        size=stat.st_size,
+        mtime=mtime,
+        segment=segment,
+    )
+
+
+def discover(data_dir=DATA_DIR):
+    # Sorted file names keep each month's delta segments right after its CSV
+    partitions = []
+    for fname in sorted(os.listdir(data_dir)):
+        match = FILE_PATTERN.match(fname)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            partitions.append(describe_partition(os.path.join(data_dir, fname), year, month))
+        match = DELTA_PATTERN.match(fname)
+        if match:
+            year, month, segment = (int(g) for g in match.groups())
+            partition = describe_segment(os.path.join(data_dir, fname), year, month, segment)
+            if partition:
+                partitions.append(partition)
+    return partitions
+
+
+def overlapping(partitions, start, end):
+    return [p for p in partitions if p.start <= end and p.end >= start]
+
+
+def full_range(partitions):
+    return min(p.start for p in partitions), max(p.end for p in partitions)
+
+
+def latest_month(partitions):
+    # Date range of the newest month, including any delta segments appended to it
+    month = partitions[-1].name[:6]
+    return full_range([p for p in partitions if p.name[:6] == month])
+
+
+def load_partition(partition, columns=None):
+    # Ingests a missing or stale cache first; a read-only directory falls back to the CSV
+    if partition.segment:
+        return read_segment(partition.csv_path, columns=columns)
+    return read_trips(partition.csv_path, columns=columns)
+
+
+def fresh_parquet(partition):
+    # The partition's Parquet file if it is current, else None
+    if partition.segment:
+        return None if segment_is_stale(partition.csv_path) else partition.csv_path
+    path = parquet_path_for(partition.csv_path)
+    return None if is_stale(partition.csv_path, path) else path
+
+
+def parquet_file(partition):
+    # Path of the partition's current Parquet file, ingesting it on first use; raises
+    # OSError when the data directory is read-only and the cache cannot be written
+    path = fresh_parquet(partition)
+    if path:
+        return path
+    if partition.segment:
+        refresh_segment(partition.csv_path)
+        return partition.csv_path
+    return ingest_csv(partition.csv_path)
+
+
+def partition_rows(partition):
+    # Row count from the Parquet footer, or None until the partition is ingested
+    path = fresh_parquet(partition)
+    return pq.ParquetFile(path).metadata.num_rows if path else None
+
+
+def quality_counters(partition):
+    # Counters written at ingest; a partition parsed straight from a read-only CSV is counted here
+    path = fresh_parquet(partition)
+    if path:
+        counters = quality.decode_counters(pq.read_schema(path).metadata)
+        if counters is not None:
+            return counters
+    return quality.counters(load_partition(partition, columns=['quality'])['quality'].to_numpy())
+
+
+def concat_partitions(frames):
+    # Align categories first so the concatenated columns stay categorical
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    frames = [f.copy(deep=False) for f in frames]
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            categories = pd.Index([])
+            for f in frames:
+                categories = categories.union(f[col].cat.categories, sort=False)
+            for f in frames:
+                f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def merge_order(frames):
+    # None when the frames are already in started_at order end to end (deltas usually
+    # start after the rows before them), else the stable permutation that sorts them
+    frames = [f for f in frames if len(f)]
+    if len(frames) <= 1:
+        return None
+    started = np.concatenate([f['started_at'].to_numpy().astype('datetime64[us]').view('i8')
+                              for f in frames])
+    if (np.diff(started) >= 0).all():
+        return None
+    return np.argsort(started, kind='stable')
+
+
+def concat_trips(frames):
+    # Trip frames concatenated in started_at order (NaT first, as ingest.sort_by_start)
+    combined = concat_partitions(frames)
+    order = merge_order(frames)
+    if order is None:
+        return combined
+    return combined.take(order).reset_index(drop=True)
+
+
+def dataset_version(partitions):
+    # Changes whenever a selected partition is added, rewritten or grows
+    state = repr([(p.name, p.size, p.mtime) for p in partitions])
+    return hashlib.sha1(state.encode()).hexdigest()[:12]
+
+
+def date_range_label(start, end):
+    if (start.year, start.month) == (end.year, end.month):
+        return start.strftime('%B %Y')
+    return f"{start.strftime('%b %Y')} – {end.strftime('%b %Y')}"
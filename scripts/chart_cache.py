@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# -----------------------
+# Bounded LRU Caches for Chart Aggregates and Figures
+# -----------------------
+# Chart functions are keyed on a small FilterKey instead of the filtered DataFrame,
+# so a lookup costs a tuple hash rather than hashing every row of the frame.
+AGGREGATE_CACHE_SIZE = 256
+FIGURE_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True)
+class FilterKey:
+    members: tuple
+    date_range: tuple
+    version: str
+    seed: int
+
+
+def filter_key(members, date_range, version, seed):
+    return FilterKey(tuple(sorted(members)), (date_range[0], date_range[1]), version, seed)
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key, compute):
+        # (value, hit); the hit flag lets a caller count its own lookups, since the
+        # totals below are shared by every session
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key], True
+            self.misses += 1
+        # Compute outside the lock so one slow chart does not block other sessions
+        value = compute()
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+        return value, False
+
+    def get_or_compute(self, key, compute):
+        return self.lookup(key, compute)[0]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+class ChartCache:
+    def __init__(self, aggregate_size=AGGREGATE_CACHE_SIZE, figure_size=FIGURE_CACHE_SIZE):
+        self.aggregates = LRUCache(aggregate_size)
+        self.figures = LRUCache(figure_size)
+
+    def aggregate(self, name, key, compute):
+        return self.aggregates.get_or_compute((name, key), compute)
+
+    def figure(self, name, key, build):
+        return self.figures.get_or_compute((name, key), build)
+
+    def stats(self):
+        return {
+            'aggregates': self.aggregates.stats(),
+            'figures': self.figures.stats(),
+        }
+
+    def session(self, recorder):
+        return CacheSession(self, recorder)
+
+
+class CacheSession:
+    # One rerun's view of the shared ChartCache: lookups hit the shared caches and are
+    # counted on the rerun's metrics.Recorder, so other sessions' traffic is not
+    # attributed to this rerun's spans
+    def __init__(self, cache, recorder):
+        self.cache = cache
+        self.recorder = recorder
+
+    def aggregate(self, name, key, compute):
+        value, hit = self.cache.aggregates.lookup((name, key), compute)
+        self.recorder.lookup(hit)
+        return value
+
+    def figure(self, name, key, build):
+        value, hit = self.cache.figures.lookup((name, key), build)
+        self.recorder.lookup(hit)
+        return value
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,63 @@
+import pandas as pd
+
+import quality
+from catalog import concat_partitions
+
+# -----------------------
+# Pre-aggregated Trip Cube (date x hour x day_of_week x member_casual)
+# -----------------------
+CUBE_KEYS = ['date', 'start_hour', 'day_of_week', 'member_casual']
+
+
+def build_cube(df):
+    # Every trip is counted; only durations that passed validation enter the means
+    keyed = pd.DataFrame({
+        'date': df['started_at'].dt.normalize(),
+        'start_hour': df['start_hour'],
+        'day_of_week': df['day_of_week'],
+        'member_casual': df['member_casual'],
+        'ride_duration': df['ride_duration'].where(quality.valid(df['quality'], quality.BAD_DURATION)),
+    })
+    cube = keyed.groupby(CUBE_KEYS, observed=True)['ride_duration']\
+                .agg(count='size', duration_sum='sum', duration_count='count')\
+                .reset_index()
+    cube['start_hour'] = cube['start_hour'].astype('int8')
+    return cube
+
+
+def concat_cubes(cubes):
+    combined = concat_partitions(cubes)
+    if combined.empty:
+        return combined
+    return combined.groupby(CUBE_KEYS, observed=True, as_index=False)\
+                   [['count', 'duration_sum', 'duration_count']].sum()
+
+
+def slice_cube(cube, members, date_range):
+    start = pd.Timestamp(date_range[0])
+    end = pd.Timestamp(date_range[1])
+    return cube[
+        (cube['member_casual'].isin(members)) &
+        (cube['date'] >= start) &
+        (cube['date'] <= end)
+    ]
+
+
+def rollup(cube, keys):
+    out = cube.groupby(keys, observed=True)[['count', 'duration_sum', 'duration_count']]\
+              .sum().reset_index()
+    out['mean_duration'] = out['duration_sum'] / out['duration_count']
+    return out
+
+
+def by_day_of_week(cube):
+    return rollup(cube, ['day_of_week', 'member_casual']).sort_values('day_of_week')
+
+
+def by_hour(cube):
+    return rollup(cube, ['start_hour', 'member_casual'])
+
+
+def by_day_night(cube):
+    keyed = cube.assign(is_daytime=cube['start_hour'].between(6, 18))
+    return rollup(keyed, ['member_casual', 'is_daytime'])
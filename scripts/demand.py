@@ -0,0 +1,236 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import catalog
+
+# -----------------------
+# Station x Hour Demand Forecasts
+# -----------------------
+# Demand is trip starts per station per hour. Each partition is reduced once to
+# sufficient statistics per station and hour of the week (168 slots): starts,
+# squared hourly starts, and the calendar days covered. Statistics add across
+# partitions, so a new month only reduces that month and refitting is a weighted
+# sum over months (recent months weigh more, HALF_LIFE_DAYS), vectorized across
+# every station at once.
+#
+# The forecast for an hour is the station's seasonal mean for that slot, scaled by
+# a level factor comparing its latest month with the seasonal mean (shrunk toward 1
+# by LEVEL_PRIOR pseudo-trips). Bands are +/- Z standard deviations of the slot.
+SLOTS = 168
+HALF_LIFE_DAYS = 60
+LEVEL_PRIOR = 20
+Z = 1.28
+
+
+@dataclass(frozen=True)
+class DemandStats:
+    stations: pd.Index      # start station names
+    starts: np.ndarray      # (stations, SLOTS) trip starts
+    starts_sq: np.ndarray   # (stations, SLOTS) sum of squared hourly starts
+    days: np.ndarray        # sorted epoch days with at least one trip
+
+    @property
+    def month(self):
+        return str(np.datetime64(int(self.days[0]), 'D'))[:7]
+
+
+@dataclass(frozen=True)
+class DemandModel:
+    stations: pd.Index
+    rate: np.ndarray        # (stations, SLOTS) expected starts per hour
+    var: np.ndarray         # (stations, SLOTS) variance of hourly starts
+    level: np.ndarray       # (stations,) recent level factor
+    start: pd.Timestamp     # first hour after the training data
+    months: tuple
+
+
+def hour_slots(hours):
+    # Epoch hours to hour-of-week slots, Monday 00:00 first (1970-01-01 was a Thursday)
+    return ((hours // 24 + 3) % 7) * 24 + hours % 24
+
+
+def slot_hours(days):
+    # Calendar hours each slot covered over the given epoch days
+    return np.repeat(np.bincount((days + 3) % 7, minlength=7), 24).astype('float64')
+
+
+def from_hourly(names, station_ids, hours, counts):
+    # `station_ids` index `names`; one row per (station, epoch hour) with its trip starts
+    n = len(names)
+    flat = station_ids.astype('int64') * SLOTS + hour_slots(hours)
+    counts = counts.astype('float64')
+    return DemandStats(
+        stations=pd.Index(names),
+        starts=np.bincount(flat, weights=counts, minlength=n * SLOTS).reshape(n, SLOTS),
+        starts_sq=np.bincount(flat, weights=counts * counts, minlength=n * SLOTS).reshape(n, SLOTS),
+        days=np.unique(hours // 24),
+    )
+
+
+def build_stats(df):
+    station = df['start_station_name']
+    valid = (df['started_at'].notna() & station.notna()).to_numpy()
+    hours = df['started_at'].to_numpy()[valid].astype('datetime64[h]').view('int64')
+    codes = station.cat.codes.to_numpy()[valid].astype('int64')
+    if not len(hours):
+        return from_hourly(station.cat.categories, codes, hours, hours)
+    # One key per (station, hour) so the hourly series never exists as a dense grid
+    first, span = hours.min(), hours.max() - hours.min() + 1
+    keys, counts = np.unique(codes * span + (hours - first), return_counts=True)
+    return from_hourly(station.cat.categories, keys // span, keys % span + first, counts)
+
+
+def merge_stats(stats):
+    stats = [s for s in stats if len(s.days)]
+    names = pd.Index([])
+    for s in stats:
+        names = names.union(s.stations)
+    starts, starts_sq = np.zeros((len(names), SLOTS)), np.zeros((len(names), SLOTS))
+    for s in stats:
+        rows = names.get_indexer(s.stations)
+        starts[rows] += s.starts
+        starts_sq[rows] += s.starts_sq
+    days = np.unique(np.concatenate([s.days for s in stats])) if stats else np.array([], dtype='int64')
+    return DemandStats(stations=names, starts=starts, starts_sq=starts_sq, days=days)
+
+
+def by_month(stats):
+    # A month's delta segments share its calendar days, so they merge before weighting
+    months = {}
+    for s in stats:
+        if len(s.days):
+            months.setdefault(s.month, []).append(s)
+    return [merge_stats(group) for _, group in sorted(months.items())]
+
+
+def _fit_months(months, half_life_days, level_prior):
+    names = pd.Index([])
+    for m in months:
+        names = names.union(m.stations)
+    n = len(names)
+    starts, starts_sq, hours = np.zeros((n, SLOTS)), np.zeros((n, SLOTS)), np.zeros(SLOTS)
+    last_day = max(m.days[-1] for m in months)
+    for m in months:
+        weight = 0.5 ** ((last_day - m.days[-1]) / half_life_days)
+        rows = names.get_indexer(m.stations)
+        starts[rows] += weight * m.starts
+        starts_sq[rows] += weight * m.starts_sq
+        hours += weight * slot_hours(m.days)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.nan_to_num(starts / hours)
+        var = np.clip(np.nan_to_num(starts_sq / hours) - rate * rate, 0, None)
+    latest = months[-1]
+    observed = np.zeros(n)
+    observed[names.get_indexer(latest.stations)] = latest.starts.sum(axis=1)
+    expected = rate @ slot_hours(latest.days)
+    level = (observed + level_prior) / (expected + level_prior)
+    return DemandModel(stations=names, rate=rate, var=var, level=level,
+                       start=pd.Timestamp(np.datetime64(int(last_day) + 1, 'D')),
+                       months=tuple(m.month for m in months))
+
+
+def fit(stats, half_life_days=HALF_LIFE_DAYS, level_prior=LEVEL_PRIOR):
+    months = by_month(stats)
+    if not months:
+        raise ValueError("no trips with a start station to fit")
+    return _fit_months(months, half_life_days, level_prior)
+
+
+def backtest(stats, half_life_days=HALF_LIFE_DAYS, level_prior=LEVEL_PRIOR):
+    # Fit on every month but the latest and score the latest month's station x slot
+    # totals (weighted absolute percentage error), against the seasonal mean alone
+    months = by_month(stats)
+    if len(months) < 2:
+        return None
+    model = _fit_months(months[:-1], half_life_days, level_prior)
+    held = months[-1]
+    actual = np.zeros((len(model.stations), SLOTS))
+    known = model.stations.get_indexer(held.stations)
+    actual[known[known >= 0]] = held.starts[known >= 0]
+    unseen = held.starts[known < 0].sum()
+    seasonal = model.rate * slot_hours(held.days)
+    total = held.starts.sum()
+    return {
+        'month': held.month,
+        'trips': int(total),
+        'wape': (np.abs(seasonal * model.level[:, None] - actual).sum() + unseen) / total,
+        'seasonal_wape': (np.abs(seasonal - actual).sum() + unseen) / total,
+    }
+
+
+def forecast(model, hours=24, start=None, stations=None):
+    # Long frame of (station, hour, expected, lower, upper) for the next `hours` hours
+    start = model.start if start is None else pd.Timestamp(start).floor('h')
+    stamps = pd.date_range(start, periods=hours, freq='h')
+    slots = hour_slots(stamps.to_numpy().astype('datetime64[h]').view('int64'))
+    rows = np.arange(len(model.stations)) if stations is None else model.stations.get_indexer(stations)
+    rows = rows[rows >= 0]
+    level = model.level[rows, None]
+    expected = model.rate[rows][:, slots] * level
+    spread = Z * np.sqrt(model.var[rows][:, slots]) * level
+    return pd.DataFrame({
+        'station': np.repeat(model.stations.to_numpy()[rows], len(stamps)),
+        'hour': np.tile(stamps.to_numpy(), len(rows)),
+        'expected': expected.ravel(),
+        'lower': np.clip(expected - spread, 0, None).ravel(),
+        'upper': (expected + spread).ravel(),
+    })
+
+
+def citywide(model, hours=24, start=None):
+    # All stations summed per hour; slot variances add across stations
+    start = model.start if start is None else pd.Timestamp(start).floor('h')
+    stamps = pd.date_range(start, periods=hours, freq='h')
+    slots = hour_slots(stamps.to_numpy().astype('datetime64[h]').view('int64'))
+    expected = (model.rate[:, slots] * model.level[:, None]).sum(axis=0)
+    spread = Z * np.sqrt((model.var[:, slots] * model.level[:, None] ** 2).sum(axis=0))
+    return pd.DataFrame({'hour': stamps, 'expected': expected,
+                         'lower': np.clip(expected - spread, 0, None), 'upper': expected + spread})
+
+
+def top_stations(model, hours=24, start=None, n=15):
+    start = model.start if start is None else pd.Timestamp(start).floor('h')
+    stamps = pd.date_range(start, periods=hours, freq='h')
+    slots = hour_slots(stamps.to_numpy().astype('datetime64[h]').view('int64'))
+    totals = model.rate[:, slots].sum(axis=1) * model.level
+    top = np.argsort(-totals, kind='stable')[:n]
+    return pd.DataFrame({'station': model.stations.to_numpy()[top], 'expected': totals[top]})
+
+
+def partition_stats(partition):
+    return build_stats(catalog.load_partition(partition, columns=['started_at', 'start_station_name']))
+
+
+def train(partitions, workers=1):
+    # Partitions reduce independently, so they spread across a process pool. Fitting and
+    # the backtest are single numpy passes over every station at once and take
+    # milliseconds, so they are not split by station; one partition reduces serially.
+    if workers > 1 and len(partitions) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            stats = list(pool.map(partition_stats, partitions))
+    else:
+        stats = [partition_stats(p) for p in partitions]
+    return stats, fit(stats)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fit station demand forecasts and print the busiest stations")
+    parser.add_argument('data_dir', nargs='?', default=catalog.DATA_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    stats, model = train(catalog.discover(args.data_dir), args.workers)
+    print(f"Fitted {len(model.stations):,} stations on {len(model.months)} months "
+          f"({model.months[0]} to {model.months[-1]})")
+    score = backtest(stats)
+    if score:
+        print(f"Backtest {score['month']}: WAPE {score['wape']:.1%} (seasonal mean alone {score['seasonal_wape']:.1%})")
+    print(f"Next {args.hours} hours from {model.start:%Y-%m-%d %H:%M}:")
+    print(top_stations(model, args.hours, n=args.top).to_string(index=False, float_format='{:,.1f}'.format))
@@ -1,72 +1,182 @@
 import streamlit as st # type: ignore
 st.set_page_config(layout="wide")
 
+import os
+
 import pandas as pd
 import numpy as np
 import plotly.express as px
+import pydeck as pdk
 from datetime import datetime
 
+import catalog
+import chart_cache
+import cube
+import durations
+import engine
+import filters
+import flows
+import metrics
+import panels
+import quality
+import sampling
+import spatial
+import stations
+import store
+
 # -----------------------
 # Data Loading and Caching
 # -----------------------
 @st.cache_data
-def load_data():
-    try:
-        df = pd.read_csv("/Users/hassaanulhaq/Library/Mobile Documents/com~apple~CloudDocs/spring_2025/transit_hackaton/divvyviz.github.io/data_files/202004-divvy-tripdata.csv")
-        df['started_at'] = pd.to_datetime(df['started_at'])
-        df['ended_at'] = pd.to_datetime(df['ended_at'])
-        df['ride_duration'] = (df['ended_at'] - df['started_at']).dt.total_seconds() / 60
-        df['start_hour'] = df['started_at'].dt.hour
-        df['day_of_week'] = df['started_at'].dt.day_name()
-        df['is_daytime'] = df['start_hour'].between(6, 18)
-        # Create a route column early
-        df['route'] = df['start_station_name'] + " → " + df['end_station_name']
-        return df
-    except Exception as e:
-        st.error("Error loading data: " + str(e))
-        return pd.DataFrame()
+def load_catalog(data_dir, listing):
+    # `listing` only keys the cache so new or updated monthly files are picked up
+    return catalog.discover(data_dir)
+
+# Trip frames use cache_resource: every session shares one read-only copy per process
+# (cache_data would hand each session its own deserialized copy). Loaders keyed on a
+# partition hold one entry per file; loaders keyed on a selection of partitions keep
+# at most store.SELECTION_CACHE_ENTRIES, and trip rows are never concatenated per selection.
+@st.cache_resource
+def load_partition(partition):
+    return store.load_shared(partition)
+
+@st.cache_resource
+def load_partition_index(partition):
+    return filters.build_index(load_partition(partition))
+
+@st.cache_resource
+def load_partition_stations(partition):
+    return stations.build_station_index(load_partition(partition))
+
+# Per-partition aggregates come from the query engine selected by DIVVY_ENGINE: pandas
+# over the shared frames above, or duckdb straight from the Parquet files
+@st.cache_resource
+def get_query_engine(name):
+    return engine.get_engine(name, frames=load_partition,
+                             trips=lambda partition: (load_partition_index(partition),
+                                                      load_partition_stations(partition)))
+
+query_engine = get_query_engine(engine.ENGINE)
+
+@st.cache_resource
+def load_partition_sample(partition):
+    return query_engine.sample(partition)
+
+@st.cache_resource(max_entries=store.SELECTION_CACHE_ENTRIES)
+def load_sample(partitions):
+    return sampling.merge_samples([load_partition_sample(p) for p in partitions])
+
+@st.cache_resource(max_entries=store.SELECTION_CACHE_ENTRIES)
+def load_sample_index(partitions):
+    return filters.build_index(load_sample(partitions))
+
+@st.cache_data
+def load_partition_cube(partition):
+    return query_engine.cube(partition)
+
+@st.cache_data(max_entries=store.SELECTION_CACHE_ENTRIES)
+def load_cube(partitions):
+    return cube.concat_cubes([load_partition_cube(p) for p in partitions])
+
+@st.cache_data
+def load_partition_durations(partition):
+    return query_engine.durations(partition)
 
-df = load_data()
+@st.cache_data(max_entries=store.SELECTION_CACHE_ENTRIES)
+def load_durations(partitions):
+    return durations.concat_summaries([load_partition_durations(p) for p in partitions])
+
+@st.cache_data(max_entries=store.SELECTION_CACHE_ENTRIES)
+def load_quality(partitions):
+    # Counters stored with each partition at ingest; no trip rows are read
+    return quality.report([catalog.quality_counters(p) for p in partitions])
+
+@st.cache_data
+def load_partition_grid(partition):
+    return query_engine.grid(partition)
+
+@st.cache_data(max_entries=store.SELECTION_CACHE_ENTRIES)
+def load_grid(partitions):
+    return spatial.concat_grids([load_partition_grid(p) for p in partitions])
+
+# Flows are dense station x 15-minute arrays, shared read-only like the trip frames;
+# a selection slices them per session (flows.select_flows)
+@st.cache_resource(max_entries=store.FLOW_CACHE_ENTRIES)
+def load_partition_flows(partition):
+    return query_engine.flows(partition)
+
+# -----------------------
+# Instrumentation (process-wide registry, one recorder per rerun)
+# -----------------------
+@st.cache_resource
+def get_metrics():
+    registry = metrics.Registry()
+    if metrics.METRICS_PORT:
+        # Prometheus text on http://127.0.0.1:<port>/metrics
+        metrics.serve(registry, metrics.METRICS_PORT)
+    return registry
+
+recorder = metrics.Recorder(get_metrics())
+
+try:
+    with recorder.span('catalog') as span:
+        partitions = load_catalog(catalog.DATA_DIR, tuple(
+            (entry.name, entry.stat().st_mtime) for entry in os.scandir(catalog.DATA_DIR)))
+        span.rows = len(partitions)
+except Exception as e:
+    st.error("Error reading data catalog: " + str(e))
+    st.stop()
+if not partitions:
+    st.error("No monthly Divvy trip files found in " + catalog.DATA_DIR)
+    st.stop()
 
 # -----------------------
 # Chart Functions with Caching and Error Reporting
 # -----------------------
-@st.cache_data
-def get_fig_donut_total(filtered_df):
+# Keyed on a chart_cache.FilterKey; the frames are only read on a cache miss.
+@st.cache_resource
+def get_chart_cache():
+    return chart_cache.ChartCache()
+
+# Shared across sessions; this rerun's hits and misses are counted on its own recorder
+charts = get_chart_cache().session(recorder)
+
+def get_fig_donut_total(key, sample_df):
     try:
-        trip_counts = filtered_df['member_casual'].value_counts().rename_axis('member_casual')\
-                                          .reset_index(name='count')
-        fig = px.pie(trip_counts, values='count', names='member_casual', hole=0.5,
-                     title="Trip Distribution by User Type")
-        return fig
+        trip_counts = charts.aggregate('donut_total', key, lambda: sampling.weighted_counts(
+            sample_df, ['member_casual']).reset_index(name='count'))
+        return charts.figure('donut_total', key, lambda: px.pie(
+            trip_counts, values='count', names='member_casual', hole=0.5,
+            title="Trip Distribution by User Type"))
     except Exception as e:
         st.error("Error in get_fig_donut_total: " + str(e))
         return None
 
-@st.cache_data
-def get_fig_donut_avg(filtered_df):
+def get_fig_donut_avg(key, sample_df):
     try:
-        avg_duration = filtered_df.groupby('member_casual')['ride_duration'].mean().reset_index()
-        fig = px.pie(avg_duration, values='ride_duration', names='member_casual', hole=0.5,
-                     title="Average Trip Duration by User Type")
-        return fig
+        avg_duration = charts.aggregate('donut_avg', key, lambda: sampling.weighted_mean(
+            sample_df[quality.valid(sample_df['quality'], quality.BAD_DURATION)], 'ride_duration',
+            ['member_casual']).reset_index(name='ride_duration'))
+        return charts.figure('donut_avg', key, lambda: px.pie(
+            avg_duration, values='ride_duration', names='member_casual', hole=0.5,
+            title="Average Trip Duration by User Type"))
     except Exception as e:
         st.error("Error in get_fig_donut_avg: " + str(e))
         return None
 
-@st.cache_data
-def get_fig_day_night(filtered_df):
+def get_fig_day_night(key, cube_slice):
     try:
-        day_night = filtered_df.groupby(['member_casual', 'is_daytime']).size()\
-                               .reset_index(name='count')
-        # Filter out groups with too few observations
-        day_night = day_night[day_night['count'] > 10]
-        fig = px.sunburst(day_night,
-                          path=['member_casual', 'is_daytime'],
-                          values='count',
-                          title="Day vs Night Trips by User Type",
-                          maxdepth=2)
-        return fig
+        def aggregate():
+            day_night = cube.by_day_night(cube_slice)[['member_casual', 'is_daytime', 'count']]
+            # Filter out groups with too few observations
+            return day_night[day_night['count'] > quality.MIN_GROUP_TRIPS]
+        day_night = charts.aggregate('day_night', key, aggregate)
+        return charts.figure('day_night', key, lambda: px.sunburst(
+            day_night,
+            path=['member_casual', 'is_daytime'],
+            values='count',
+            title="Day vs Night Trips by User Type",
+            maxdepth=2))
     except Exception as e:
         st.error("Error in get_fig_day_night: " + str(e))
         return None
@@ -74,137 +184,250 @@ def get_fig_day_night(filtered_df):
 # -----------------------
 # Title and Global Filters
 # -----------------------
-st.title("🚲 Divvy Bike Trip Dashboard - April 2020")
+title = st.empty()
 
 col1, col2 = st.columns(2)
-with col1:
-    members = st.multiselect("Select User Types", df['member_casual'].unique(),
-                               default=df['member_casual'].unique())
 with col2:
-    date_range = st.date_input("Select Date Range", [df['started_at'].min().date(),
-                                                     df['started_at'].max().date()])
+    # Default to the most recent month so a cold start only loads one month
+    first_day, last_day = catalog.full_range(partitions)
+    date_range = st.date_input("Select Date Range", list(catalog.latest_month(partitions)),
+                               min_value=first_day, max_value=last_day)
+    if len(date_range) < 2:
+        date_range = (date_range[0], date_range[0])
+
+selected = tuple(catalog.overlapping(partitions, date_range[0], date_range[1]))
+# The cube answers the global filters without loading any trip rows
+with recorder.span('load_cube') as span:
+    trips_cube = load_cube(selected)
+    span.rows = int(trips_cube['count'].sum()) if len(trips_cube) else 0
+if trips_cube.empty:
+    st.warning("No trips found for the selected date range.")
+    st.stop()
+
+title.title("🚲 Divvy Bike Trip Dashboard - " + catalog.date_range_label(date_range[0], date_range[1]))
+
+with col1:
+    members = st.multiselect("Select User Types", trips_cube['member_casual'].unique(),
+                               default=trips_cube['member_casual'].unique())
+
+chart_key = chart_cache.filter_key(members, date_range, catalog.dataset_version(selected),
+                                   sampling.SAMPLE_SEED)
+
+# Filtered views are built on first use, so only what the active panel needs is touched.
+# Trip rows are only read by the pandas engine's top routes, as positions into the shared frame.
+budget = store.SessionBudget()
+data = panels.LazyInputs(
+    budget=budget,
+    recorder=recorder,
+    top_routes=lambda: query_engine.top_routes(selected, tuple(members), date_range, 15),
+    sample_df=lambda: filters.filter_trips(load_sample(selected), load_sample_index(selected),
+                                           members, date_range),
+    filtered_cube=lambda: cube.slice_cube(load_cube(selected), members, date_range),
+    filtered_durations=lambda: durations.slice_summary(load_durations(selected), members, date_range),
+    station_flows=lambda: flows.select_flows([load_partition_flows(p) for p in selected], date_range),
+)
+inputs = {
+    'members': chart_key.members,
+    'date_range': chart_key.date_range,
+    'version': chart_key.version,
+    'seed': chart_key.seed,
+}
 
-filtered_df = df[
-    (df['member_casual'].isin(members)) &
-    (df['started_at'].dt.date >= date_range[0]) &
-    (df['started_at'].dt.date <= date_range[1])
-]
+with st.sidebar.expander("Chart cache"):
+    st.json(charts.stats())
+with st.sidebar.expander("Data quality"):
+    st.caption("Trips flagged at ingest in the selected months; flagged values are left out of the charts")
+    st.dataframe(load_quality(selected).style.format({'share': '{:.2%}'}), hide_index=True)
+memory_report = st.sidebar.expander("Memory").empty()
+debug = st.sidebar.checkbox("Debug timings", value=bool(os.environ.get('DIVVY_DEBUG')))
+debug_report = st.sidebar.empty()
 
 # -----------------------
-# Tabs Setup
+# Panels Setup (only the selected panel runs on a rerun)
 # -----------------------
-tab1, tab2, tab3, tab4 = st.tabs(["Overview", "Patterns", "Durations", "Map"])
-
-# Initialize session state flags for donut plots
-if "donuts_loaded" not in st.session_state:
-    st.session_state.donuts_loaded = False
-if "donut_plots" not in st.session_state:
-    st.session_state.donut_plots = {}
+dashboard = panels.Dashboard(charts, recorder)
+FILTER_DEPS = ('members', 'date_range', 'version')
 
 # -----------------------
 # Tab1: Overview with Donut Plots
 # -----------------------
-with tab1:
+@dashboard.panel("Overview", deps=FILTER_DEPS + ('seed',))
+def overview_panel(ctx):
     st.subheader("Overview")
-    # Use a small sample to reduce computation time
-    sample_df = filtered_df if len(filtered_df) < 1000 else filtered_df.sample(1000)
-
-    # Load the donut plots on demand
-    if st.button("Load Donut Plots", key="load_donuts") or st.session_state.donuts_loaded:
-        if not st.session_state.donuts_loaded:
-            with st.spinner("Generating donut plots..."):
-                total_fig = get_fig_donut_total(sample_df)
-                avg_fig = get_fig_donut_avg(sample_df)
-                day_night_fig = get_fig_day_night(sample_df)
-                st.session_state.donut_plots = {
-                    "total": total_fig,
-                    "avg": avg_fig,
-                    "day_night": day_night_fig,
-                }
-                st.session_state.donuts_loaded = True
-
-        col1, col2, col3 = st.columns(3)
-        if st.session_state.donut_plots.get("total"):
-            col1.plotly_chart(st.session_state.donut_plots["total"], use_container_width=True)
-        if st.session_state.donut_plots.get("avg"):
-            col2.plotly_chart(st.session_state.donut_plots["avg"], use_container_width=True)
-        if st.session_state.donut_plots.get("day_night"):
-            col3.plotly_chart(st.session_state.donut_plots["day_night"], use_container_width=True)
-    else:
-        st.info("Click the button above to load the donut plots.")
+    # Donuts are estimated from the weighted stratified sample
+    # Figures come from the shared chart cache, so nothing is pinned per session
+    total_fig = get_fig_donut_total(chart_key, ctx.sample_df)
+    avg_fig = get_fig_donut_avg(chart_key, ctx.sample_df)
+    day_night_fig = get_fig_day_night(chart_key, ctx.filtered_cube)
+
+    col1, col2, col3 = st.columns(3)
+    if total_fig:
+        col1.plotly_chart(total_fig, use_container_width=True)
+    if avg_fig:
+        col2.plotly_chart(avg_fig, use_container_width=True)
+    if day_night_fig:
+        col3.plotly_chart(day_night_fig, use_container_width=True)
 
 # -----------------------
 # Tab2: Patterns (Weekly and Hourly)
 # -----------------------
-with tab2:
+@dashboard.panel("Patterns", deps=FILTER_DEPS)
+def patterns_panel(ctx):
     st.subheader("Weekly Ride Patterns")
     try:
-        dow = filtered_df.groupby(['day_of_week', 'member_casual']).size().reset_index(name='count')
-        dow['day_of_week'] = pd.Categorical(dow['day_of_week'],
-                                            categories=['Monday', 'Tuesday', 'Wednesday', 'Thursday',
-                                                        'Friday', 'Saturday', 'Sunday'],
-                                            ordered=True)
-        dow = dow.sort_values('day_of_week')
-        fig_dow = px.bar(dow, x='day_of_week', y='count', color='member_casual',
-                         barmode='group', title="Rides by Day of Week")
-        st.plotly_chart(fig_dow, use_container_width=True)
+        def build_dow():
+            dow = cube.by_day_of_week(ctx.filtered_cube)
+            fig_dow = px.bar(dow, x='day_of_week', y='count', color='member_casual',
+                             barmode='group', title="Rides by Day of Week")
+            return fig_dow
+        ctx.chart('dow', build_dow)
     except Exception as e:
         st.error("Error in Weekly Ride Patterns: " + str(e))
 
     st.subheader("Hourly Ride Pattern by User Type")
     try:
-        hourly = filtered_df.groupby(['start_hour', 'member_casual']).size()\
-                            .reset_index(name='count')
-        fig_hourly = px.line(hourly, x='start_hour', y='count', color='member_casual',
-                             markers=True, title="Hourly Ride Trends")
-        st.plotly_chart(fig_hourly, use_container_width=True)
+        def build_hourly():
+            hourly = cube.by_hour(ctx.filtered_cube)
+            fig_hourly = px.line(hourly, x='start_hour', y='count', color='member_casual',
+                                 markers=True, title="Hourly Ride Trends")
+            return fig_hourly
+        ctx.chart('hourly', build_hourly)
     except Exception as e:
         st.error("Error in Hourly Ride Trends: " + str(e))
 
 # -----------------------
 # Tab3: Durations and Routes
 # -----------------------
-with tab3:
+@dashboard.panel("Durations", deps=FILTER_DEPS)
+def durations_panel(ctx):
     st.subheader("Trip Duration Density (Under 2 Hours)")
     try:
-        fig_density = px.violin(filtered_df[filtered_df['ride_duration'] < 120],
-                                x='member_casual', y='ride_duration', box=True,
-                                points='all', title="Trip Duration under 2 Hours")
-        st.plotly_chart(fig_density, use_container_width=True)
+        def build_density():
+            # Density per user type from the pre-binned duration summaries
+            density = durations.histogram(ctx.filtered_durations, ['member_casual'], max_minutes=120, width=2)
+            density['share'] = density['count'] / density.groupby('member_casual', observed=True)['count'].transform('sum')
+            fig_density = px.line(density, x='bin_center', y='share', color='member_casual',
+                                  labels={'bin_center': 'ride_duration', 'share': 'Share of Trips'},
+                                  title="Trip Duration under 2 Hours")
+            return fig_density
+        ctx.chart('density', build_density)
     except Exception as e:
         st.error("Error in Trip Duration Density: " + str(e))
     
     st.subheader("Trip Duration by Day vs Night")
     try:
-        day_night_avg = filtered_df.groupby(['member_casual', 'is_daytime'])['ride_duration']\
-                                   .mean().reset_index()
-        day_night_avg['time_of_day'] = day_night_avg['is_daytime'].replace({True: "Day", False: "Night"})
-        fig_daynight_avg = px.bar(day_night_avg, x='member_casual', y='ride_duration',
-                                  color='time_of_day', barmode='group',
-                                  title="Avg. Trip Duration: Day vs Night")
-        st.plotly_chart(fig_daynight_avg, use_container_width=True)
+        def build_daynight_avg():
+            day_night_avg = cube.by_day_night(ctx.filtered_cube).rename(columns={'mean_duration': 'ride_duration'})
+            day_night_avg['time_of_day'] = day_night_avg['is_daytime'].replace({True: "Day", False: "Night"})
+            fig_daynight_avg = px.bar(day_night_avg, x='member_casual', y='ride_duration',
+                                      color='time_of_day', barmode='group',
+                                      title="Avg. Trip Duration: Day vs Night")
+            return fig_daynight_avg
+        ctx.chart('daynight_avg', build_daynight_avg)
     except Exception as e:
         st.error("Error in Trip Duration by Day vs Night: " + str(e))
     
     st.subheader("Top 15 Most Popular Routes")
     try:
-        route_counts = filtered_df['route'].value_counts().head(15).reset_index()
-        route_counts.columns = ['Route', 'Count']
-        st.dataframe(route_counts)
+        route_counts = ctx.memo('top_routes', lambda: ctx.top_routes[['route', 'count']])
+        st.dataframe(route_counts.rename(columns={'route': 'Route', 'count': 'Count'}))
     except Exception as e:
         st.error("Error in Top 15 Routes: " + str(e))
 
 # -----------------------
 # Tab4: Map of Start Locations
 # -----------------------
-with tab4:
+@dashboard.panel("Map", deps=FILTER_DEPS)
+def map_panel(ctx):
     st.subheader("Map of Start Locations")
     try:
-        map_data = filtered_df[['start_lat', 'start_lng']]\
-                            .dropna()\
-                            .rename(columns={'start_lat': 'lat', 'start_lng': 'lon'})
-        if len(map_data) > 1000:
-            map_data = map_data.sample(1000)
-        st.map(map_data)
+        map_col1, map_col2 = st.columns(2)
+        endpoint = map_col1.radio("Trip Endpoint", list(spatial.ENDPOINTS), horizontal=True)
+        level = map_col2.select_slider("Grid Resolution", list(spatial.GRID_LEVELS), value='fine')
+        # Every trip is counted; the payload is bounded by the number of grid cells
+        map_data = ctx.memo('map_density', lambda: spatial.density(
+            load_grid(selected), members, date_range, level, endpoint), level, endpoint)
+        st.pydeck_chart(pdk.Deck(
+            map_style=None,
+            initial_view_state=pdk.ViewState(latitude=41.88, longitude=-87.63, zoom=11),
+            layers=[pdk.Layer(
+                'HeatmapLayer',
+                data=map_data,
+                get_position=['lon', 'lat'],
+                get_weight='count',
+                aggregation='SUM',
+            )],
+        ))
+        st.caption(f"{int(map_data['count'].sum()):,} trips in {len(map_data):,} grid cells")
+    except Exception as e:
+        st.error("Error in Map: " + str(e))
+
+# -----------------------
+# Tab5: Station Flows (rebalancing)
+# -----------------------
+@dashboard.panel("Station Flows", deps=('date_range', 'version'))
+def flows_panel(ctx):
+    st.subheader("Station Net Flow and Inventory")
+    try:
+        # Bikes move whoever rides them, so flows cover every user type
+        station_flows = ctx.station_flows
+        summary = ctx.memo('flow_summary', lambda: flows.summary(station_flows))
+        st.caption(f"{len(summary):,} stations in {flows.BUCKET_MINUTES}-minute buckets. Bikes needed is the "
+                   "stock a station must start with never to run empty, docks needed the free docks it "
+                   "must start with never to fill up.")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            def build_imbalance():
+                top = summary.loc[summary['net_flow'].abs().sort_values(ascending=False).index[:15]]
+                fig_imbalance = px.bar(top, x='net_flow', y='station', orientation='h',
+                                       color='net_flow', color_continuous_scale='RdBu',
+                                       color_continuous_midpoint=0,
+                                       title='Largest Net Flows (arrivals - departures)',
+                                       labels={'net_flow': 'Net Flow', 'station': ''})
+                fig_imbalance.update_layout(plot_bgcolor='white', height=400,
+                                            yaxis={'categoryorder': 'total ascending'},
+                                            margin=dict(l=20, r=20, t=50, b=20))
+                return fig_imbalance
+            ctx.chart('imbalance', build_imbalance, container=col1)
+        with col2:
+            st.dataframe(summary.sort_values('bikes_needed', ascending=False).head(15),
+                         hide_index=True, use_container_width=True)
+
+        ranked = summary.sort_values('bikes_needed', ascending=False)['station']
+        station = st.selectbox("Station", ranked)
+
+        def build_inventory():
+            series = flows.station_series(station_flows, station)
+            fig_inventory = px.line(series, x='time', y='inventory',
+                                    title=f"Running Inventory Change at {station}",
+                                    labels={'time': 'Time', 'inventory': 'Bikes vs. Start of Range'})
+            fig_inventory.update_layout(plot_bgcolor='white', height=350, margin=dict(l=20, r=20, t=50, b=20))
+            return fig_inventory
+        ctx.chart('inventory', build_inventory, extra=(station,))
+
+        def build_profile():
+            profile = flows.daily_profile(station_flows, ranked.head(20))
+            fig_profile = px.imshow(profile, aspect='auto', color_continuous_scale='RdBu',
+                                    color_continuous_midpoint=0,
+                                    title='Average Net Flow by Time of Day (stations needing the most bikes)',
+                                    labels={'x': 'Time of Day', 'y': '', 'color': 'Net Flow'})
+            fig_profile.update_layout(height=500, margin=dict(l=20, r=20, t=50, b=20))
+            return fig_profile
+        ctx.chart('profile', build_profile)
     except Exception as e:
-        st.error("Error in Map: " + str(e))
\ No newline at end of file
+        st.error("Error in Station Flows: " + str(e))
+
+dashboard.run(inputs, data)
+memory_report.json({
+    'session': budget.report(),
+    'engine': query_engine.name,
+    'shared_trips_mb': round(sum(store.nbytes(load_partition(p)) for p in selected) / 2 ** 20, 1)
+                       if query_engine.name == 'pandas' else 0,
+})
+if debug:
+    with debug_report.container():
+        st.caption("This rerun, slowest first")
+        st.dataframe(pd.DataFrame(recorder.slowest()), hide_index=True)
+        st.caption("Slowest panels since start (mean)")
+        st.dataframe(pd.DataFrame(recorder.registry.slowest('panel')), hide_index=True)
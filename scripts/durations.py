@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+import quality
+from catalog import concat_partitions
+
+# -----------------------
+# Mergeable Duration Summaries (fixed-bin histograms with per-bin moments)
+# -----------------------
+# Durations are binned at BIN_WIDTH minutes per (member_casual, time_of_day, date).
+# Durations flagged at ingest (negative, MAX_MINUTES or longer, unparsed) are left
+# out through the quality mask, so every binned trip lies in [0, MAX_MINUTES).
+# Summaries merge by adding counts, so quantiles, histograms and means over any
+# filter come from a few thousand rows instead of the trips themselves; quantiles
+# are exact to within one bin width.
+BIN_WIDTH = 0.5
+MAX_MINUTES = quality.MAX_DURATION_MINUTES
+N_BINS = int(MAX_MINUTES / BIN_WIDTH)
+SUMMARY_KEYS = ['member_casual', 'time_of_day', 'date', 'bin']
+
+
+def build_summary(df):
+    valid = quality.valid(df['quality'], quality.BAD_DURATION)
+    minutes = df['ride_duration'].to_numpy('float64')[valid]
+    bins = np.clip(np.floor(minutes / BIN_WIDTH), -1, N_BINS).astype('int16')
+    binned = pd.DataFrame({
+        'member_casual': df['member_casual'][valid].to_numpy(),
+        'time_of_day': df['time_of_day'][valid].to_numpy(),
+        'date': df['started_at'][valid].dt.normalize().to_numpy(),
+        'bin': bins,
+        'minutes': minutes,
+        'minutes_sq': minutes * minutes,
+    })
+    return binned.groupby(SUMMARY_KEYS, observed=True)\
+                 .agg(count=('minutes', 'size'), sum=('minutes', 'sum'), sum_sq=('minutes_sq', 'sum'))\
+                 .reset_index()
+
+
+def concat_summaries(summaries):
+    combined = concat_partitions(summaries)
+    if combined.empty:
+        return combined
+    return combined.groupby(SUMMARY_KEYS, observed=True, as_index=False)[['count', 'sum', 'sum_sq']].sum()
+
+
+def slice_summary(summary, members, date_range):
+    return summary[
+        (summary['member_casual'].isin(members)) &
+        (summary['date'] >= pd.Timestamp(date_range[0])) &
+        (summary['date'] <= pd.Timestamp(date_range[1]))
+    ]
+
+
+def _up_to(summary, max_minutes):
+    return summary[summary['bin'] < int(max_minutes / BIN_WIDTH)]
+
+
+def histogram(summary, by, max_minutes=MAX_MINUTES, width=BIN_WIDTH):
+    # Re-bin to `width` minutes (a multiple of BIN_WIDTH)
+    rows = _up_to(summary, max_minutes)
+    step = max(int(round(width / BIN_WIDTH)), 1)
+    hist = rows.assign(bin_start=(rows['bin'].clip(lower=0) // step) * step * BIN_WIDTH)\
+               .groupby(by + ['bin_start'], observed=True)['count'].sum().reset_index()
+    hist['bin_center'] = hist['bin_start'] + step * BIN_WIDTH / 2
+    return hist
+
+
+def moments(summary, by, max_minutes=MAX_MINUTES):
+    out = _up_to(summary, max_minutes).groupby(by, observed=True)[['count', 'sum', 'sum_sq']].sum()
+    out['mean'] = out['sum'] / out['count']
+    variance = (out['sum_sq'] - out['count'] * out['mean'] ** 2) / (out['count'] - 1)
+    out['std'] = np.sqrt(variance.clip(lower=0))
+    return out.reset_index()
+
+
+def _group_quantiles(bins, counts, qs):
+    # Linear interpolation inside the bin holding each quantile; out-of-range bins are clamped
+    order = np.argsort(bins)
+    bins, counts = bins[order], counts[order]
+    cum = np.cumsum(counts)
+    total = cum[-1]
+    out = []
+    for q in qs:
+        target = q * total
+        i = min(int(np.searchsorted(cum, target, side='left')), len(bins) - 1)
+        before = cum[i - 1] if i else 0
+        frac = (target - before) / counts[i] if counts[i] else 0.0
+        edge = min(max(bins[i], 0), N_BINS - 1) * BIN_WIDTH
+        out.append(edge + frac * BIN_WIDTH)
+    return out
+
+
+def quantiles(summary, by, qs=(0.25, 0.5, 0.75), max_minutes=MAX_MINUTES):
+    rows = _up_to(summary, max_minutes)
+    records = []
+    for key, group in rows.groupby(by, observed=True):
+        agg = group.groupby('bin')['count'].sum()
+        values = _group_quantiles(agg.index.to_numpy(), agg.to_numpy(), qs)
+        key = key if isinstance(key, tuple) else (key,)
+        records.append(dict(zip(by, key), **{f"q{int(q * 100)}": v for q, v in zip(qs, values)}))
+    return pd.DataFrame(records, columns=by + [f"q{int(q * 100)}" for q in qs])
+
+
+def box_stats(summary, by, max_minutes=MAX_MINUTES):
+    # Tukey box: quartiles plus 1.5 IQR whiskers clipped to the observed range
+    stats = quantiles(summary, by, (0.0, 0.25, 0.5, 0.75, 1.0), max_minutes)
+    iqr = stats['q75'] - stats['q25']
+    stats['lowerfence'] = np.maximum(stats['q0'], stats['q25'] - 1.5 * iqr)
+    stats['upperfence'] = np.minimum(stats['q100'], stats['q75'] + 1.5 * iqr)
+    return stats.merge(moments(summary, by, max_minutes)[by + ['mean']], on=by, how='left')
@@ -0,0 +1,259 @@
+import os
+import threading
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import catalog
+import cube
+import demand
+import durations
+import filters
+import flows
+import ingest
+import quality
+import sampling
+import spatial
+import stations
+
+# -----------------------
+# Query Engines for the Dashboard Aggregates
+# -----------------------
+# Both engines produce the same per-partition structures (cube, duration summary,
+# density grid, stratified sample, demand statistics, station flows) and the top
+# routes of a selection.
+#   pandas  builds them from the eager partition frames (the default).
+#   duckdb  runs SQL over the Parquet partitions out of core: the date and user
+#           type filters are pushed into the scan (files are sorted by started_at,
+#           so row-group statistics skip most of a range), only the columns a
+#           chart needs are read, and execution is vectorized over all cores.
+# Select with DIVVY_ENGINE=pandas|duckdb.
+ENGINE = os.environ.get('DIVVY_ENGINE', 'pandas')
+DUCKDB_MEMORY_LIMIT = os.environ.get('DIVVY_DUCKDB_MEMORY_LIMIT')
+SAMPLE_COLUMNS = ['ride_id', 'started_at', 'member_casual', 'start_hour', 'time_of_day', 'ride_duration', 'quality']
+
+
+def _no_routes():
+    return pd.DataFrame(columns=['start_station_name', 'end_station_name', 'count', 'route'])
+
+
+def _trips(partition, frames=catalog.load_partition):
+    df = frames(partition)
+    return filters.build_index(df), stations.build_station_index(df)
+
+
+class PandasEngine:
+    name = 'pandas'
+
+    def __init__(self, frames=catalog.load_partition, trips=None):
+        # `frames` loads one partition; `trips` maps a partition to its
+        # (TripIndex, StationIndex), so callers can pass their cached loaders
+        self.frames = frames
+        self.trips = trips or (lambda partition: _trips(partition, frames))
+
+    def cube(self, partition):
+        return cube.build_cube(self.frames(partition))
+
+    def durations(self, partition):
+        return durations.build_summary(self.frames(partition))
+
+    def grid(self, partition):
+        return spatial.build_grids(self.frames(partition))
+
+    def sample(self, partition):
+        return sampling.build_sample(self.frames(partition))
+
+    def demand(self, partition):
+        # The model trains on every month, so read only the two columns it needs rather
+        # than loading (and pinning, through a caching `frames`) each full partition
+        return demand.partition_stats(partition)
+
+    def flows(self, partition):
+        return flows.build_flows(self.frames(partition))
+
+    def top_routes(self, partitions, members, date_range, n=15):
+        if not partitions:
+            return _no_routes()
+        # Each partition selects its own rows; the OD matrices add, so no selection is concatenated
+        parts = []
+        for partition in partitions:
+            index, station_index = self.trips(partition)
+            rows = filters.filter_rows(index, members, date_range)
+            parts.append((stations.od_matrix(station_index, rows), station_index.stations))
+        od, table = stations.merge_od(parts)
+        return stations.top_routes(od, table, n)
+
+
+def parquet_paths(partitions):
+    # Current Parquet files, ingested on first use; None when the data directory is
+    # read-only and a cache cannot be written
+    try:
+        return [catalog.parquet_file(p) for p in partitions]
+    except OSError:
+        return None
+
+
+def _categorical(df, column, categories=None):
+    df[column] = pd.Categorical(df[column], categories=categories) if categories else df[column].astype('category')
+
+
+class DuckDBEngine:
+    name = 'duckdb'
+
+    def __init__(self, memory_limit=DUCKDB_MEMORY_LIMIT):
+        import duckdb
+        self._db = duckdb.connect()
+        if memory_limit:
+            self._db.execute(f"SET memory_limit = '{memory_limit}'")
+        self._local = threading.local()
+        # Partitions without a Parquet file are answered from their CSV instead
+        self._fallback = PandasEngine()
+
+    def _query(self, sql, params=()):
+        # One cursor per thread; cursors share the database and its thread pool
+        if not hasattr(self._local, 'cursor'):
+            self._local.cursor = self._db.cursor()
+        return self._local.cursor.execute(sql, params).df()
+
+    def cube(self, partition):
+        paths = parquet_paths([partition])
+        if paths is None:
+            return self._fallback.cube(partition)
+        valid = f"quality & {quality.BAD_DURATION} = 0"
+        out = self._query(f"""
+            SELECT CAST(date_trunc('day', started_at) AS TIMESTAMP) AS date, start_hour, day_of_week,
+                   member_casual, count(*) AS count,
+                   coalesce(sum(ride_duration) FILTER (WHERE {valid}), 0) AS duration_sum,
+                   count(ride_duration) FILTER (WHERE {valid}) AS duration_count
+            FROM read_parquet(?)
+            WHERE started_at IS NOT NULL AND member_casual IS NOT NULL AND day_of_week IS NOT NULL
+            GROUP BY ALL
+            ORDER BY ALL
+        """, paths)
+        out['start_hour'] = out['start_hour'].astype('int8')
+        _categorical(out, 'day_of_week', ingest.DAY_NAMES)
+        _categorical(out, 'member_casual')
+        return out[cube.CUBE_KEYS + ['count', 'duration_sum', 'duration_count']]
+
+    def durations(self, partition):
+        paths = parquet_paths([partition])
+        if paths is None:
+            return self._fallback.durations(partition)
+        out = self._query(f"""
+            SELECT member_casual, time_of_day, CAST(date_trunc('day', started_at) AS TIMESTAMP) AS date,
+                   CAST(least(greatest(floor(minutes / {durations.BIN_WIDTH}), -1), {durations.N_BINS})
+                        AS SMALLINT) AS bin,
+                   count(*) AS count, sum(minutes) AS sum, sum(minutes * minutes) AS sum_sq
+            FROM (SELECT *, CAST(ride_duration AS DOUBLE) AS minutes FROM read_parquet(?))
+            WHERE quality & {quality.BAD_DURATION} = 0
+              AND member_casual IS NOT NULL AND time_of_day IS NOT NULL
+            GROUP BY ALL
+            ORDER BY ALL
+        """, paths)
+        return out[durations.SUMMARY_KEYS + ['count', 'sum', 'sum_sq']]
+
+    def grid(self, partition):
+        paths = parquet_paths([partition])
+        if paths is None:
+            return self._fallback.grid(partition)
+        selects = []
+        for endpoint, (lat, lng) in spatial.ENDPOINTS.items():
+            for level, size in spatial.GRID_LEVELS.items():
+                selects.append(f"""
+                    SELECT '{endpoint}' AS endpoint, '{level}' AS level,
+                           CAST(floor(CAST({lat} AS DOUBLE) / {size}) AS INTEGER) AS cell_y,
+                           CAST(floor(CAST({lng} AS DOUBLE) / {size}) AS INTEGER) AS cell_x,
+                           date, member_casual, count(*) AS count
+                    FROM trips
+                    WHERE quality & {quality.OFF_MAP[endpoint]} = 0
+                    GROUP BY ALL""")
+        out = self._query(f"""
+            WITH trips AS (
+                SELECT CAST(date_trunc('day', started_at) AS TIMESTAMP) AS date, member_casual,
+                       start_lat, start_lng, end_lat, end_lng, quality
+                FROM read_parquet(?)
+                WHERE started_at IS NOT NULL AND member_casual IS NOT NULL
+            )
+            {' UNION ALL '.join(selects)}
+        """, paths)
+        for column in ['endpoint', 'level', 'member_casual']:
+            _categorical(out, column)
+        return out[spatial.GRID_KEYS + ['count']]
+
+    def sample(self, partition):
+        # The seeded hash sample needs pandas; read only the columns it and its charts use
+        paths = parquet_paths([partition])
+        if paths is None:
+            return self._fallback.sample(partition)
+        df = pq.read_table(paths[0], columns=SAMPLE_COLUMNS, memory_map=True).to_pandas()
+        return sampling.build_sample(df)
+
+    def demand(self, partition):
+        paths = parquet_paths([partition])
+        if paths is None:
+            return self._fallback.demand(partition)
+        hourly = self._query("""
+            SELECT start_station_name AS station, datediff('hour', TIMESTAMP '1970-01-01', started_at) AS hour,
+                   count(*) AS count
+            FROM read_parquet(?)
+            WHERE started_at IS NOT NULL AND start_station_name IS NOT NULL
+            GROUP BY ALL
+        """, paths)
+        names = pd.Index(sorted(hourly['station'].unique()))
+        return demand.from_hourly(names, names.get_indexer(hourly['station']),
+                                  hourly['hour'].to_numpy('int64'), hourly['count'].to_numpy())
+
+    def flows(self, partition):
+        paths = parquet_paths([partition])
+        if paths is None:
+            return self._fallback.flows(partition)
+        events = self._query(f"""
+            SELECT 'departure' AS side, start_station_name AS station,
+                   CAST(floor(datediff('minute', TIMESTAMP '1970-01-01', started_at) / {flows.BUCKET_MINUTES})
+                        AS BIGINT) AS bucket, count(*) AS count
+            FROM read_parquet($1)
+            WHERE started_at IS NOT NULL AND start_station_name IS NOT NULL
+            GROUP BY ALL
+            UNION ALL
+            SELECT 'arrival', end_station_name,
+                   CAST(floor(datediff('minute', TIMESTAMP '1970-01-01', ended_at) / {flows.BUCKET_MINUTES})
+                        AS BIGINT), count(*)
+            FROM read_parquet($1)
+            WHERE ended_at IS NOT NULL AND end_station_name IS NOT NULL
+            GROUP BY ALL
+        """, paths)
+        names = pd.Index(sorted(events['station'].unique()))
+        sides = []
+        for side in ['departure', 'arrival']:
+            rows = events[events['side'] == side]
+            sides.append((names.get_indexer(rows['station']), rows['bucket'].to_numpy('int64'),
+                          rows['count'].to_numpy('float64')))
+        return flows.from_events(names, *sides)
+
+    def top_routes(self, partitions, members, date_range, n=15):
+        if not partitions or not members:
+            return _no_routes()
+        paths = parquet_paths(partitions)
+        if paths is None:
+            return self._fallback.top_routes(partitions, members, date_range, n)
+        routes = self._query(f"""
+            SELECT start_station_name, end_station_name, count(*) AS count
+            FROM read_parquet(?)
+            WHERE started_at >= ? AND started_at < ? + INTERVAL 1 DAY
+              AND member_casual IN ({', '.join('?' for _ in members)})
+              AND start_station_name IS NOT NULL AND end_station_name IS NOT NULL
+            GROUP BY ALL
+            ORDER BY count DESC, start_station_name, end_station_name
+            LIMIT {int(n)}
+        """, [paths, pd.Timestamp(date_range[0]),
+              pd.Timestamp(date_range[1]), *members])
+        routes['route'] = routes['start_station_name'] + " → " + routes['end_station_name']
+        return routes
+
+
+def get_engine(name=ENGINE, **pandas_options):
+    if name == 'duckdb':
+        return DuckDBEngine()
+    if name == 'pandas':
+        return PandasEngine(**pandas_options)
+    raise ValueError(f"unknown engine {name!r}; expected 'pandas' or 'duckdb'")
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import plotly.io as pio
+
+# -----------------------
+# Figure Preparation: Point Budgets
+# -----------------------
+# Figures are built from small aggregate tables; prepare() then enforces a per-chart
+# point budget so a websocket message stays bounded regardless of data size:
+# long line/scatter traces are reduced with Largest-Triangle-Three-Buckets and
+# per-row box/violin points are capped or dropped.
+POINT_BUDGET = int(os.environ.get('DIVVY_POINT_BUDGET', 2000))
+LINE_TYPES = {'scatter', 'scattergl'}
+POINT_TYPES = {'box', 'violin'}
+
+
+def lttb(x, y, threshold):
+    # Indices of the points kept by Largest-Triangle-Three-Buckets downsampling
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    keep = np.empty(threshold, dtype='int64')
+    keep[0], keep[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype('int64')
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def _is_numeric(values):
+    try:
+        np.asarray(values, dtype='float64')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def downsample(fig, budget=POINT_BUDGET):
+    traces = [t for t in fig.data if t.type in LINE_TYPES and t.x is not None and t.y is not None]
+    per_trace = max(budget // max(len(traces), 1), 3)
+    for trace in traces:
+        if len(trace.x) > per_trace and _is_numeric(trace.x) and _is_numeric(trace.y):
+            keep = lttb(trace.x, trace.y, per_trace)
+            updates = {'x': np.asarray(trace.x)[keep], 'y': np.asarray(trace.y)[keep]}
+            if trace.customdata is not None:
+                updates['customdata'] = np.asarray(trace.customdata)[keep]
+            trace.update(**updates)
+    return fig
+
+
+def cap_points(fig, budget=POINT_BUDGET):
+    # Per-row points on distribution traces ship every observation; drop them once over budget
+    for trace in fig.data:
+        if trace.type in POINT_TYPES:
+            values = trace.y if trace.y is not None else trace.x
+            if values is not None and len(values) > budget:
+                if trace.type == 'box':
+                    trace.update(boxpoints=False)
+                else:
+                    trace.update(points=False)
+    return fig
+
+
+def prepare(fig, budget=POINT_BUDGET):
+    return cap_points(downsample(fig, budget), budget)
+
+
+def to_payload(fig):
+    # The JSON plotly_chart sends, for measuring payload sizes (benchmark.py)
+    return pio.to_json(fig, validate=False)
@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+# -----------------------
+# Sorted-timestamp Index and Per-category Row Bitmaps
+# -----------------------
+# The trip frame is kept sorted by started_at (NaT first, see ingest.sort_by_start),
+# so a date range resolves to one contiguous [lo, hi) slice via binary search.
+
+
+@dataclass(frozen=True)
+class TripIndex:
+    started: np.ndarray   # started_at as int64 ticks, ascending
+    dtype: np.dtype       # datetime64 unit of `started`
+    bitmaps: dict         # member_casual value -> boolean row mask
+
+
+def build_index(df):
+    values = df['started_at'].to_numpy()
+    started = values.view('i8')
+    if len(started) > 1 and (np.diff(started) < 0).any():
+        raise ValueError("trip frame must be sorted by started_at")
+    codes = df['member_casual'].cat.codes.to_numpy()
+    bitmaps = {cat: codes == i for i, cat in enumerate(df['member_casual'].cat.categories)}
+    return TripIndex(started=started, dtype=values.dtype, bitmaps=bitmaps)
+
+
+def date_slice(index, start, end):
+    # Inclusive calendar dates -> half-open [start 00:00, end + 1 day 00:00)
+    bounds = np.array([pd.Timestamp(start), pd.Timestamp(end + timedelta(days=1))],
+                      dtype=index.dtype).view('i8')
+    lo, hi = np.searchsorted(index.started, bounds, side='left')
+    return int(lo), int(hi)
+
+
+def member_mask(index, members, lo, hi):
+    members = set(members)
+    if members >= set(index.bitmaps):
+        return None
+    mask = np.zeros(hi - lo, dtype=bool)
+    for cat in members & set(index.bitmaps):
+        mask |= index.bitmaps[cat][lo:hi]
+    return mask
+
+
+def filter_rows(index, members, date_range):
+    # Positional row selection: a contiguous slice, or slice-relative positions
+    lo, hi = date_slice(index, date_range[0], date_range[1])
+    mask = member_mask(index, members, lo, hi)
+    if mask is None:
+        return slice(lo, hi)
+    return lo + np.flatnonzero(mask)
+
+
+def filter_trips(df, index, members, date_range):
+    # A view of the sorted frame when every user type is selected, otherwise a copy of the range only
+    return df.iloc[filter_rows(index, members, date_range)]
@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# -----------------------
+# Station Net Flow and Inventory at 15-minute Resolution
+# -----------------------
+# Every trip is a departure from its start station in the bucket of started_at
+# and an arrival at its end station in the bucket of ended_at. Both are counted for
+# all stations at once with np.bincount over (station id, bucket) keys, giving dense
+# station x bucket arrays; the running inventory change is their cumulative sum
+# along time. Arrivals more than ARRIVAL_GRACE_BUCKETS after a partition's last
+# departure (clock errors, bikes never docked) are dropped so one bad ended_at
+# cannot stretch the arrays.
+BUCKET_MINUTES = 15
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+ARRIVAL_GRACE_BUCKETS = BUCKETS_PER_DAY
+
+
+@dataclass(frozen=True)
+class StationFlows:
+    stations: pd.Index       # station names
+    first: int               # epoch bucket of column 0
+    arrivals: np.ndarray     # (stations, buckets) int32
+    departures: np.ndarray
+
+    @property
+    def times(self):
+        return pd.date_range(bucket_time(self.first), periods=self.arrivals.shape[1],
+                             freq=f'{BUCKET_MINUTES}min')
+
+
+def to_buckets(times):
+    return np.asarray(times).astype('datetime64[m]').view('int64') // BUCKET_MINUTES
+
+
+def bucket_time(bucket):
+    return pd.Timestamp(np.datetime64(int(bucket) * BUCKET_MINUTES, 'm'))
+
+
+def _empty(names):
+    n = len(names)
+    return StationFlows(stations=pd.Index(names), first=0,
+                        arrivals=np.zeros((n, 0), dtype='int32'), departures=np.zeros((n, 0), dtype='int32'))
+
+
+def _counts(ids, buckets, weights, first, n, width):
+    keys = ids.astype('int64') * width + (buckets - first)
+    return np.bincount(keys, weights=weights, minlength=n * width).reshape(n, width).astype('int32')
+
+
+def from_events(names, departures, arrivals):
+    # Each side is (station ids into `names`, epoch buckets, counts or None)
+    dep_ids, dep_buckets, dep_counts = departures
+    arr_ids, arr_buckets, arr_counts = arrivals
+    if not len(dep_buckets):
+        return _empty(names)
+    first = int(dep_buckets.min())
+    last = int(dep_buckets.max()) + ARRIVAL_GRACE_BUCKETS
+    keep = (arr_buckets >= first) & (arr_buckets <= last)
+    if arr_counts is not None:
+        arr_counts = arr_counts[keep]
+    last = max(int(dep_buckets.max()), int(arr_buckets[keep].max()) if keep.any() else first)
+    n, width = len(names), last - first + 1
+    return StationFlows(
+        stations=pd.Index(names),
+        first=first,
+        arrivals=_counts(arr_ids[keep], arr_buckets[keep], arr_counts, first, n, width),
+        departures=_counts(dep_ids, dep_buckets, dep_counts, first, n, width),
+    )
+
+
+def _events(station, times, names):
+    mapping = names.get_indexer(station.cat.categories)
+    codes = station.cat.codes.to_numpy()
+    valid = (codes >= 0) & times.notna().to_numpy()
+    return mapping[codes[valid]], to_buckets(times.to_numpy()[valid]), None
+
+
+def build_flows(df):
+    names = df['start_station_name'].cat.categories.union(df['end_station_name'].cat.categories)
+    return from_events(names, _events(df['start_station_name'], df['started_at'], names),
+                       _events(df['end_station_name'], df['ended_at'], names))
+
+
+def concat_flows(flows):
+    # Partitions overlap where trips cross a month boundary, so columns add
+    flows = [f for f in flows if f.arrivals.shape[1]]
+    if not flows:
+        return _empty(pd.Index([]))
+    if len(flows) == 1:
+        return flows[0]
+    names = pd.Index([])
+    for f in flows:
+        names = names.union(f.stations)
+    first = min(f.first for f in flows)
+    width = max(f.first + f.arrivals.shape[1] for f in flows) - first
+    arrivals = np.zeros((len(names), width), dtype='int32')
+    departures = np.zeros((len(names), width), dtype='int32')
+    for f in flows:
+        rows = names.get_indexer(f.stations)
+        cols = slice(f.first - first, f.first - first + f.arrivals.shape[1])
+        arrivals[rows, cols] += f.arrivals
+        departures[rows, cols] += f.departures
+    return StationFlows(stations=names, first=first, arrivals=arrivals, departures=departures)
+
+
+def slice_flows(flows, date_range):
+    # Buckets from the first day's midnight up to the end of the last day (views, no copy)
+    start = int(to_buckets(np.datetime64(pd.Timestamp(date_range[0]).normalize())))
+    end = int(to_buckets(np.datetime64(pd.Timestamp(date_range[1]).normalize()))) + BUCKETS_PER_DAY
+    lo = min(max(start - flows.first, 0), flows.arrivals.shape[1])
+    hi = min(max(end - flows.first, lo), flows.arrivals.shape[1])
+    return StationFlows(stations=flows.stations, first=flows.first + lo,
+                        arrivals=flows.arrivals[:, lo:hi], departures=flows.departures[:, lo:hi])
+
+
+def select_flows(flows, date_range):
+    # Each partition is sliced to the range before the columns add, so only the
+    # selected buckets are copied (a single partition stays a view)
+    return concat_flows([slice_flows(f, date_range) for f in flows])
+
+
+def net_flow(flows):
+    return flows.arrivals.astype('int64') - flows.departures
+
+
+def inventory(flows):
+    # Running change in docked bikes since the start of the range
+    return np.cumsum(net_flow(flows), axis=1)
+
+
+def summary(flows):
+    # Per station totals and the range of its running inventory; `bikes_needed` is the
+    # stock it must start with never to run dry, `docks_needed` the free docks
+    running = np.hstack([np.zeros((len(flows.stations), 1), dtype='int64'), inventory(flows)])
+    out = pd.DataFrame({
+        'station': flows.stations,
+        'arrivals': flows.arrivals.sum(axis=1),
+        'departures': flows.departures.sum(axis=1),
+        'net_flow': running[:, -1],
+        'bikes_needed': -running.min(axis=1),
+        'docks_needed': running.max(axis=1),
+    })
+    return out[(out['arrivals'] > 0) | (out['departures'] > 0)]
+
+
+def station_series(flows, station):
+    row = flows.stations.get_loc(station)
+    arrivals, departures = flows.arrivals[row], flows.departures[row]
+    net = arrivals.astype('int64') - departures
+    return pd.DataFrame({'time': flows.times, 'arrivals': arrivals, 'departures': departures,
+                         'net_flow': net, 'inventory': np.cumsum(net)})
+
+
+def daily_profile(flows, stations):
+    # Mean net flow per time-of-day bucket for the given stations (rows: stations)
+    rows = flows.stations.get_indexer(stations)
+    net = net_flow(flows)[rows]
+    slot = (flows.first + np.arange(net.shape[1])) % BUCKETS_PER_DAY
+    profile = np.zeros((len(rows), BUCKETS_PER_DAY))
+    np.add.at(profile, (slice(None), slot), net)
+    profile /= np.maximum(np.bincount(slot, minlength=BUCKETS_PER_DAY), 1)
+    labels = [f"{m // 60:02d}:{m % 60:02d}" for m in range(0, 24 * 60, BUCKET_MINUTES)]
+    return pd.DataFrame(profile, index=pd.Index(stations, name='station'), columns=labels)
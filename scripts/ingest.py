@@ -0,0 +1,289 @@
+import glob
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import quality
+
+# -----------------------
+# Columnar Schema for Divvy Trip Files
+# -----------------------
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+TIME_OF_DAY = ['Day (6am-6pm)', 'Night (6pm-6am)']
+
+CSV_DTYPES = {
+    'ride_id': 'string',
+    'rideable_type': 'category',
+    'start_station_name': 'category',
+    'start_station_id': 'string',
+    'end_station_name': 'category',
+    'end_station_id': 'string',
+    'start_lat': 'float32',
+    'start_lng': 'float32',
+    'end_lat': 'float32',
+    'end_lng': 'float32',
+    'member_casual': 'category',
+}
+TIMESTAMP_COLUMNS = ['started_at', 'ended_at']
+TIMESTAMP_FORMAT = 'ISO8601'
+DERIVED_COLUMNS = ['ride_duration', 'start_hour', 'day_of_week', 'is_daytime', 'time_of_day', 'quality']
+MONTH_FILE = '{year:04d}{month:02d}-divvy-tripdata.csv'
+# Bump whenever the cached file layout changes so existing caches are rebuilt
+INGEST_VERSION = '5'
+
+
+def parquet_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def is_stale(csv_path, parquet_path):
+    if not os.path.exists(parquet_path):
+        return True
+    metadata = pq.read_schema(parquet_path).metadata or {}
+    if metadata.get(b'divvy_ingest_version') != INGEST_VERSION.encode():
+        return True
+    if not os.path.exists(csv_path):
+        return False
+    return os.path.getmtime(parquet_path) < os.path.getmtime(csv_path)
+
+
+def read_trip_csv(csv_path):
+    df = pd.read_csv(csv_path, dtype=CSV_DTYPES)
+    for col in TIMESTAMP_COLUMNS:
+        df[col] = pd.to_datetime(df[col], format=TIMESTAMP_FORMAT, errors='coerce')
+    return sort_by_start(df)
+
+
+def sort_by_start(df):
+    # NaT sorts first so the int64 view of started_at stays ascending (filters.build_index)
+    return df.sort_values('started_at', na_position='first', kind='stable', ignore_index=True)
+
+
+# -----------------------
+# Derived Features (computed once at ingest and stored with the partition)
+# -----------------------
+def add_derived_columns(df):
+    df['ride_duration'] = ((df['ended_at'] - df['started_at']).dt.total_seconds() / 60).astype('float32')
+    hour = df['started_at'].dt.hour
+    df['start_hour'] = hour.fillna(-1).astype('int8')
+    df['day_of_week'] = pd.Categorical.from_codes(
+        df['started_at'].dt.dayofweek.fillna(-1).astype('int8'), categories=DAY_NAMES)
+    df['is_daytime'] = hour.between(6, 18)
+    df['time_of_day'] = pd.Categorical.from_codes(
+        np.where(hour.isna(), -1, np.where((hour >= 6) & (hour < 18), 0, 1)).astype('int8'),
+        categories=TIME_OF_DAY)
+    # Validation runs once here; see quality.py for the flag bits
+    df['quality'] = quality.flag_trips(df)
+    return df
+
+
+def write_parquet(df, parquet_path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'divvy_ingest_version': INGEST_VERSION.encode(),
+        quality.METADATA_KEY: quality.encode_counters(df['quality'].to_numpy()),
+    })
+    tmp_path = parquet_path + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, parquet_path)
+
+
+def ingest_csv(csv_path, parquet_path=None):
+    parquet_path = parquet_path or parquet_path_for(csv_path)
+    write_parquet(add_derived_columns(read_trip_csv(csv_path)), parquet_path)
+    retire_deltas(csv_path, parquet_path)
+    return parquet_path
+
+
+# -----------------------
+# Chunked Ingest (bounded memory for very large files)
+# -----------------------
+# The CSV is parsed CHUNK_ROWS at a time; each chunk gets its derived columns and
+# is spilled to an uncompressed Arrow run file. The runs are then memory-mapped,
+# ordered by started_at with one stable argsort of that column alone, and written
+# out one row group at a time. The result matches ingest_csv row for row.
+CHUNK_ROWS = 500_000
+ROW_GROUP_ROWS = 250_000
+
+
+def _run_schema(table):
+    # Fixed dictionary indices and timestamp unit so every chunk shares one schema
+    # (an all-empty chunk would otherwise infer a coarser unit or a null dictionary)
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        elif pa.types.is_timestamp(field.type):
+            field = field.with_type(pa.timestamp('us'))
+        fields.append(field)
+    return pa.schema(fields, metadata={
+        **(table.schema.metadata or {}),
+        b'divvy_ingest_version': INGEST_VERSION.encode(),
+    })
+
+
+def _chunk_table(chunk, schema=None):
+    for col in TIMESTAMP_COLUMNS:
+        chunk[col] = pd.to_datetime(chunk[col], format=TIMESTAMP_FORMAT, errors='coerce')
+    table = pa.Table.from_pandas(add_derived_columns(chunk), preserve_index=False)
+    schema = schema or _run_schema(table)
+    return table.cast(schema), schema
+
+
+def ingest_csv_chunked(csv_path, parquet_path=None, chunk_rows=CHUNK_ROWS):
+    parquet_path = parquet_path or parquet_path_for(csv_path)
+    schema, runs = None, []
+    try:
+        for i, chunk in enumerate(pd.read_csv(csv_path, dtype=CSV_DTYPES, chunksize=chunk_rows)):
+            table, schema = _chunk_table(chunk, schema)
+            runs.append(f"{parquet_path}.run{i:04d}.arrow")
+            with pa.OSFile(runs[-1], 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        if schema is None:
+            # Header-only file: an empty partition through the in-memory path
+            return ingest_csv(csv_path, parquet_path)
+        combined = pa.concat_tables(
+            [pa.ipc.open_file(pa.memory_map(run)).read_all() for run in runs]).unify_dictionaries()
+        combined = combined.replace_schema_metadata({
+            **(combined.schema.metadata or {}),
+            quality.METADATA_KEY: quality.encode_counters(combined.column('quality').to_numpy()),
+        })
+        # NaT sorts first, as in sort_by_start
+        started = pc.fill_null(combined.column('started_at').cast(pa.int64()), np.iinfo('int64').min)
+        order = np.argsort(started.to_numpy(), kind='stable')
+        tmp_path = parquet_path + '.tmp'
+        with pq.ParquetWriter(tmp_path, combined.schema, compression='zstd') as writer:
+            for start in range(0, len(order), ROW_GROUP_ROWS):
+                writer.write_table(combined.take(order[start:start + ROW_GROUP_ROWS]))
+        os.replace(tmp_path, parquet_path)
+    finally:
+        for run in runs:
+            if os.path.exists(run):
+                os.remove(run)
+    retire_deltas(csv_path, parquet_path)
+    return parquet_path
+
+
+def read_trips(csv_path, columns=None):
+    # Read the typed Parquet cache, rebuilding it from the CSV when missing or stale
+    parquet_path = parquet_path_for(csv_path)
+    if is_stale(csv_path, parquet_path):
+        try:
+            ingest_csv(csv_path, parquet_path)
+        except OSError:
+            # Read-only data directory: parse the CSV directly this time
+            df = add_derived_columns(read_trip_csv(csv_path))
+            return df[columns] if columns else df
+    return pq.read_table(parquet_path, columns=columns, memory_map=True).to_pandas()
+
+
+# -----------------------
+# Incremental Append (delta segments next to each month's Parquet file)
+# -----------------------
+# New trips are parsed and derived once, split by start month and written as
+# numbered delta segments, e.g. 202006-divvy-tripdata.delta-0001.parquet. Appends
+# never rewrite existing files; the catalog lists each segment as its own partition,
+# so only caches over the months that received rows are invalidated. When the full
+# monthly CSV arrives later and is ingested, the trips it already holds are retired
+# from the month's deltas, leaving each segment with only the rows still new.
+def delta_paths(csv_path):
+    base = os.path.splitext(csv_path)[0]
+    return sorted(glob.glob(glob.escape(base) + '.delta-*.parquet'))
+
+
+def next_delta_path(csv_path):
+    existing = delta_paths(csv_path)
+    seq = int(existing[-1].rsplit('.delta-', 1)[1].split('.')[0]) + 1 if existing else 1
+    return f"{os.path.splitext(csv_path)[0]}.delta-{seq:04d}.parquet"
+
+
+def known_ride_ids(csv_path):
+    # Ride ids already stored for the month: base Parquet file plus earlier deltas
+    paths = [p for p in [parquet_path_for(csv_path)] + delta_paths(csv_path) if os.path.exists(p)]
+    if not paths:
+        return pd.Index([], dtype='string')
+    return pd.Index(pa.concat_tables([pq.read_table(p, columns=['ride_id'], memory_map=True)
+                                      for p in paths]).column('ride_id').to_pandas())
+
+
+def segment_is_stale(parquet_path):
+    metadata = pq.read_schema(parquet_path).metadata or {}
+    return metadata.get(b'divvy_ingest_version') != INGEST_VERSION.encode()
+
+
+def rederive_segment(parquet_path):
+    # Deltas have no CSV to re-ingest from; re-derive their columns from the stored rows
+    df = pq.read_table(parquet_path).to_pandas()
+    df = df.drop(columns=[c for c in DERIVED_COLUMNS if c in df.columns])
+    return add_derived_columns(sort_by_start(df))
+
+
+def refresh_segment(parquet_path):
+    if segment_is_stale(parquet_path):
+        write_parquet(rederive_segment(parquet_path), parquet_path)
+
+
+def read_segment(parquet_path, columns=None):
+    if segment_is_stale(parquet_path):
+        try:
+            refresh_segment(parquet_path)
+        except OSError:
+            # Read-only data directory: re-derive in memory this time
+            df = rederive_segment(parquet_path)
+            return df[columns] if columns else df
+    return pq.read_table(parquet_path, columns=columns, memory_map=True).to_pandas()
+
+
+def retire_deltas(csv_path, parquet_path):
+    # Rewrite each delta without the ride ids the base file now holds. A fully covered
+    # segment is left as an empty file, which the catalog skips, rather than deleted,
+    # so a catalog listed just before the rewrite can still read it.
+    deltas = delta_paths(csv_path)
+    if not deltas:
+        return
+    base_ids = pq.read_table(parquet_path, columns=['ride_id'], memory_map=True).column('ride_id').to_pandas()
+    for path in deltas:
+        df = read_segment(path)
+        covered = df['ride_id'].isin(base_ids)
+        if covered.any():
+            write_parquet(df[~covered].reset_index(drop=True), path)
+
+
+def append_csv(new_csv, data_dir):
+    df = add_derived_columns(read_trip_csv(new_csv))
+    # Trips without a start time cannot be placed in a month
+    dated = df[df['started_at'].notna()]
+    written = []
+    for (year, month), rows in dated.groupby([dated['started_at'].dt.year, dated['started_at'].dt.month]):
+        csv_path = os.path.join(data_dir, MONTH_FILE.format(year=int(year), month=int(month)))
+        rows = rows[~rows['ride_id'].isin(known_ride_ids(csv_path))]
+        if len(rows):
+            path = next_delta_path(csv_path)
+            write_parquet(rows.reset_index(drop=True), path)
+            written.append((path, len(rows)))
+    return written, len(df) - len(dated)
+
+
+# -----------------------
+# One-time Ingest: python ingest.py <csv> [<csv> ...]
+# Append new rows:  python ingest.py --append <data_dir> <csv> [<csv> ...]
+# -----------------------
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--append']:
+        data_dir = sys.argv[2]
+        for path in sys.argv[3:]:
+            written, undated = append_csv(path, data_dir)
+            for out, rows in written:
+                print(f"{path} -> {out} ({rows} new rows)")
+            if undated:
+                print(f"{path}: skipped {undated} rows without a start time")
+    else:
+        for path in sys.argv[1:]:
+            out = ingest_csv(path)
+            print(f"{path} -> {out}")
@@ -0,0 +1,197 @@
+import os
+import resource
+import sys
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------
+# Per-rerun Instrumentation and Prometheus Text Export
+# -----------------------
+# A Recorder times each data stage, input and panel of one rerun (wall time, rows
+# touched, chart-cache hits/misses, RSS delta). Finished spans are folded into a
+# process-wide Registry, which renders Prometheus text exposition format and can
+# serve it on DIVVY_METRICS_PORT for a local scraper.
+METRICS_PORT = os.environ.get('DIVVY_METRICS_PORT')
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def rss_bytes():
+    # Current resident set size; the peak is the closest portable fallback
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def row_count(value):
+    if isinstance(value, slice):
+        return max(value.stop - value.start, 0) if value.stop is not None and value.start is not None else None
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class Span:
+    def __init__(self, recorder, name, kind):
+        self.recorder = recorder
+        self.name = name
+        self.kind = kind
+        self.rows = None
+        self.seconds = 0.0
+        self.rss_delta = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.error = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._rss = rss_bytes()
+        self._cache = (self.recorder.cache_hits, self.recorder.cache_misses)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start
+        self.rss_delta = rss_bytes() - self._rss
+        self.cache_hits = self.recorder.cache_hits - self._cache[0]
+        self.cache_misses = self.recorder.cache_misses - self._cache[1]
+        self.error = exc_type.__name__ if exc_type else None
+        self.recorder.finish(self)
+        return False
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'ms': round(self.seconds * 1000, 1),
+            'rows': self.rows,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'rss_delta_mb': round(self.rss_delta / 2 ** 20, 2),
+            'error': self.error,
+        }
+
+
+class Recorder:
+    # Spans of one rerun. Cache lookups made for this rerun are reported with lookup()
+    # (chart_cache.CacheSession does so), so concurrent sessions never mix their counts.
+    def __init__(self, registry=None):
+        self.registry = registry
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = []
+
+    def span(self, name, kind='stage'):
+        return Span(self, name, kind)
+
+    def lookup(self, hit):
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    def finish(self, span):
+        self.spans.append(span)
+        if self.registry is not None:
+            self.registry.observe(span)
+
+    def slowest(self, n=10):
+        return [s.as_dict() for s in sorted(self.spans, key=lambda s: -s.seconds)[:n]]
+
+
+class Registry:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span):
+        with self._lock:
+            series = self._series.setdefault((span.kind, span.name), {
+                'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(self.buckets),
+                'rows': 0, 'hits': 0, 'misses': 0, 'rss_growth': 0, 'errors': 0,
+            })
+            series['count'] += 1
+            series['sum'] += span.seconds
+            series['max'] = max(series['max'], span.seconds)
+            i = bisect_left(self.buckets, span.seconds)
+            if i < len(self.buckets):
+                series['buckets'][i] += 1
+            series['rows'] += span.rows or 0
+            series['hits'] += span.cache_hits
+            series['misses'] += span.cache_misses
+            series['rss_growth'] += max(span.rss_delta, 0)
+            series['errors'] += span.error is not None
+
+    def slowest(self, kind=None, n=10):
+        # Mean wall time per (kind, name) since the process started
+        with self._lock:
+            rows = [
+                {'kind': k, 'name': name, 'calls': s['count'],
+                 'mean_ms': round(s['sum'] / s['count'] * 1000, 1), 'max_ms': round(s['max'] * 1000, 1)}
+                for (k, name), s in self._series.items() if kind is None or k == kind
+            ]
+        return sorted(rows, key=lambda r: -r['mean_ms'])[:n]
+
+    def render(self):
+        # Prometheus text exposition format (version 0.0.4)
+        lines = [
+            '# HELP divvy_span_seconds Wall time of dashboard stages, inputs, panels and charts.',
+            '# TYPE divvy_span_seconds histogram',
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+            for (kind, name), s in series:
+                labels = f'kind="{kind}",name="{_escape(name)}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, s['buckets']):
+                    cumulative += count
+                    lines.append(f'divvy_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'divvy_span_seconds_bucket{{{labels},le="+Inf"}} {s["count"]}')
+                lines.append(f'divvy_span_seconds_sum{{{labels}}} {s["sum"]:.6f}')
+                lines.append(f'divvy_span_seconds_count{{{labels}}} {s["count"]}')
+            for metric, key, help_text in [
+                ('divvy_span_rows_total', 'rows', 'Rows touched by each span.'),
+                ('divvy_span_cache_hits_total', 'hits', 'Cache hits inside each span.'),
+                ('divvy_span_cache_misses_total', 'misses', 'Cache misses inside each span.'),
+                ('divvy_span_rss_growth_bytes_total', 'rss_growth', 'Resident memory growth across each span.'),
+                ('divvy_span_errors_total', 'errors', 'Spans that ended with an exception.'),
+            ]:
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                lines += [f'{metric}{{kind="{kind}",name="{_escape(name)}"}} {s[key]}' for (kind, name), s in series]
+        lines += [
+            '# HELP divvy_process_resident_memory_bytes Resident memory of this process.',
+            '# TYPE divvy_process_resident_memory_bytes gauge',
+            f'divvy_process_resident_memory_bytes {rss_bytes()}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def serve(registry, port):
+    # Background /metrics endpoint; returns the server so callers can keep it alive
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', int(port)), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
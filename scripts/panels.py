@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+
+import streamlit as st
+
+import figures
+import metrics
+from store import MemoryBudgetExceeded
+
+# -----------------------
+# Lazily Evaluated Dashboard Panels
+# -----------------------
+# st.tabs executes every tab body on every rerun. A Dashboard instead renders a
+# selector and runs only the active panel. Inside a panel, ctx.memo() caches work in
+# the shared chart cache keyed on the panel's declared inputs, so a panel recomputes
+# only when one of those inputs actually changed.
+
+
+class LazyInputs:
+    # Attribute access evaluates each loader at most once per rerun; what a loader
+    # materialises is charged to the session's store.SessionBudget and timed by the
+    # rerun's metrics.Recorder
+    def __init__(self, budget=None, recorder=None, **loaders):
+        self._budget = budget
+        self._recorder = recorder
+        self._loaders = loaders
+        self._values = {}
+
+    def __getattr__(self, name):
+        loaders = self.__dict__.get('_loaders', {})
+        if name not in loaders:
+            raise AttributeError(name)
+        if name not in self._values:
+            value = _timed(self._recorder, name, 'input', loaders[name])
+            if self._budget is not None:
+                self._budget.charge(name, value)
+            self._values[name] = value
+        return self._values[name]
+
+
+def _timed(recorder, name, kind, compute):
+    if recorder is None:
+        return compute()
+    with recorder.span(name, kind) as span:
+        value = compute()
+        span.rows = metrics.row_count(value)
+    return value
+
+
+@dataclass(frozen=True)
+class Panel:
+    name: str
+    render: callable
+    deps: tuple
+
+
+class PanelContext:
+    def __init__(self, panel, inputs, data, cache, recorder=None):
+        self.panel = panel
+        self.recorder = recorder
+        self.inputs = inputs
+        self.data = data
+        self._cache = cache
+        self._key = tuple((dep, inputs[dep]) for dep in panel.deps)
+
+    def __getattr__(self, name):
+        return getattr(self.data, name)
+
+    def memo(self, label, compute, *extra):
+        return _timed(self.recorder, f"{self.panel.name}/{label}", 'memo',
+                      lambda: self._cache.aggregate((self.panel.name, label), self._key + extra, compute))
+
+    def chart(self, label, build, container=st, budget=figures.POINT_BUDGET, extra=()):
+        # Build and downsample a figure once per input version, then render it; the point
+        # budget is what bounds the message plotly_chart serializes
+        name, key = (self.panel.name, label), self._key + tuple(extra)
+        fig = _timed(self.recorder, f"{self.panel.name}/{label}", 'chart',
+                     lambda: self._cache.figure(name, key, lambda: figures.prepare(build(), budget)))
+        container.plotly_chart(fig, use_container_width=True)
+        return fig
+
+
+class Dashboard:
+    def __init__(self, cache, recorder=None):
+        self.cache = cache
+        self.recorder = recorder
+        self.panels = {}
+
+    def panel(self, name, deps=()):
+        def register(render):
+            self.panels[name] = Panel(name=name, render=render, deps=tuple(deps))
+            return render
+        return register
+
+    def run(self, inputs, data, key="active_panel"):
+        active = st.radio("View", list(self.panels), horizontal=True, key=key,
+                          label_visibility="collapsed")
+        panel = self.panels[active]
+        ctx = PanelContext(panel, inputs, data, self.cache, self.recorder)
+        try:
+            _timed(self.recorder, panel.name, 'panel', lambda: panel.render(ctx))
+        except MemoryBudgetExceeded as e:
+            st.warning(str(e))
+        return active
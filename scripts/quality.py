@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# -----------------------
+# Data-quality Flags (computed once at ingest)
+# -----------------------
+# Every trip gets a uint8 bitmask in the `quality` column; 0 means clean. Charts
+# select through these masks instead of re-applying their own thresholds, and each
+# Parquet file carries its partition's counters in the schema metadata, so they are
+# read without touching any rows.
+NEGATIVE_DURATION = 1       # ended_at before started_at (clock skew)
+LONG_DURATION = 2           # MAX_DURATION_MINUTES or longer (bike not docked, lost)
+MISSING_TIME = 4            # started_at or ended_at did not parse
+MISSING_START_STATION = 8
+MISSING_END_STATION = 16
+START_OFF_MAP = 32          # start coordinates missing or outside CHICAGO_BOUNDS
+END_OFF_MAP = 64
+
+FLAGS = {
+    'negative_duration': NEGATIVE_DURATION,
+    'long_duration': LONG_DURATION,
+    'missing_time': MISSING_TIME,
+    'missing_start_station': MISSING_START_STATION,
+    'missing_end_station': MISSING_END_STATION,
+    'start_off_map': START_OFF_MAP,
+    'end_off_map': END_OFF_MAP,
+}
+# Trips whose ride_duration is excluded from duration statistics
+BAD_DURATION = NEGATIVE_DURATION | LONG_DURATION | MISSING_TIME
+OFF_MAP = {'start': START_OFF_MAP, 'end': END_OFF_MAP}
+
+MAX_DURATION_MINUTES = 180
+CHICAGO_BOUNDS = {'lat': (41.6, 42.1), 'lng': (-88.0, -87.5)}
+# Chart groups with this many trips or fewer are too small to show
+MIN_GROUP_TRIPS = 10
+METADATA_KEY = b'divvy_quality'
+
+
+def _off_map(lat, lng):
+    lat = np.asarray(lat, dtype='float64')
+    lng = np.asarray(lng, dtype='float64')
+    # NaN fails both comparisons, so missing coordinates count as off the map
+    inside = (lat >= CHICAGO_BOUNDS['lat'][0]) & (lat <= CHICAGO_BOUNDS['lat'][1]) & \
+             (lng >= CHICAGO_BOUNDS['lng'][0]) & (lng <= CHICAGO_BOUNDS['lng'][1])
+    return ~inside
+
+
+def flag_trips(df):
+    minutes = df['ride_duration'].to_numpy(dtype='float64')
+    flags = np.zeros(len(df), dtype='uint8')
+    flags |= np.where(minutes < 0, NEGATIVE_DURATION, 0).astype('uint8')
+    flags |= np.where(minutes >= MAX_DURATION_MINUTES, LONG_DURATION, 0).astype('uint8')
+    flags |= np.where(np.isnan(minutes), MISSING_TIME, 0).astype('uint8')
+    flags |= np.where(df['start_station_name'].isna().to_numpy(), MISSING_START_STATION, 0).astype('uint8')
+    flags |= np.where(df['end_station_name'].isna().to_numpy(), MISSING_END_STATION, 0).astype('uint8')
+    flags |= np.where(_off_map(df['start_lat'], df['start_lng']), START_OFF_MAP, 0).astype('uint8')
+    flags |= np.where(_off_map(df['end_lat'], df['end_lng']), END_OFF_MAP, 0).astype('uint8')
+    return flags
+
+
+def valid(flags, bits):
+    # Boolean mask of trips with none of `bits` set
+    return (np.asarray(flags) & bits) == 0
+
+
+def counters(flags):
+    flags = np.asarray(flags)
+    # One bincount over the 256 possible masks, then a count per bit
+    masks = np.bincount(flags, minlength=256)
+    out = {'rows': int(len(flags)), 'clean': int(masks[0])}
+    for name, bit in FLAGS.items():
+        out[name] = int(masks[(np.arange(256) & bit) != 0].sum())
+    return out
+
+
+def merge_counters(parts):
+    out = {'rows': 0, 'clean': 0, **{name: 0 for name in FLAGS}}
+    for part in parts:
+        for name in out:
+            out[name] += part.get(name, 0)
+    return out
+
+
+def encode_counters(flags):
+    return json.dumps(counters(flags)).encode()
+
+
+def decode_counters(metadata):
+    raw = (metadata or {}).get(METADATA_KEY)
+    return json.loads(raw) if raw else None
+
+
+def report(parts):
+    # Per flag: trips and share of all trips, for display
+    total = merge_counters(parts)
+    rows = max(total['rows'], 1)
+    return pd.DataFrame({
+        'check': ['clean'] + list(FLAGS),
+        'trips': [total['clean']] + [total[name] for name in FLAGS],
+        'share': [total['clean'] / rows] + [total[name] / rows for name in FLAGS],
+    })
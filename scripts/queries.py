@@ -0,0 +1,259 @@
+import os
+from dataclasses import replace
+from datetime import date
+from functools import lru_cache
+
+import pyarrow.parquet as pq
+
+import catalog
+import cube
+import demand
+import durations
+import engine
+import filters
+import flows
+import quality
+import spatial
+import stations
+
+# -----------------------
+# Headless Dashboard Aggregates
+# -----------------------
+# The same aggregates the Streamlit dashboards draw, computed without Streamlit from
+# the per-partition structures (cube, duration summaries, density grids, station
+# index) and returned as plain records. Per-partition work is cached per process
+# and runs on the query engine selected by DIVVY_ENGINE (see engine.py).
+PARTITION_CACHE_SIZE = int(os.environ.get('DIVVY_PARTITION_CACHE_SIZE', 24))
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def partition_frame(partition):
+    return catalog.load_partition(partition)
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def partition_cube(partition):
+    return query_engine.cube(partition)
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def partition_durations(partition):
+    return query_engine.durations(partition)
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def partition_grid(partition):
+    return query_engine.grid(partition)
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def partition_stations(partition):
+    return stations.build_station_index(partition_frame(partition))
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def partition_flows(partition):
+    return query_engine.flows(partition)
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def partition_demand(partition):
+    return query_engine.demand(partition)
+
+
+@lru_cache(maxsize=4)
+def demand_model(partitions):
+    # Refitting after a new month reuses every cached month's statistics
+    return demand.fit([partition_demand(p) for p in partitions])
+
+
+@lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def _trips(partition):
+    return filters.build_index(partition_frame(partition)), partition_stations(partition)
+
+
+query_engine = engine.get_engine(frames=partition_frame, trips=_trips)
+
+
+def _records(df):
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+
+def describe_file(csv_path):
+    # A single trip CSV outside the monthly naming scheme becomes a one-file catalog.
+    # Its name gives no month, so it is ingested up front and spans the days of its
+    # started_at statistics (the column itself when the directory is read-only).
+    match = catalog.FILE_PATTERN.match(os.path.basename(csv_path))
+    if match:
+        return catalog.describe_partition(csv_path, int(match.group(1)), int(match.group(2)))
+    stat = os.stat(csv_path)
+    partition = catalog.Partition(name=os.path.splitext(os.path.basename(csv_path))[0], csv_path=csv_path,
+                                  start=date.min, end=date.max, size=stat.st_size, mtime=stat.st_mtime)
+    try:
+        bounds = catalog.started_at_bounds(pq.ParquetFile(catalog.parquet_file(partition)))
+    except OSError:
+        bounds = None
+    if bounds is None:
+        started = catalog.load_partition(partition, columns=['started_at'])['started_at'].dropna()
+        if started.empty:
+            raise LookupError(f"no trips with a start time in {csv_path}")
+        bounds = started.min().date(), started.max().date()
+    return replace(partition, start=bounds[0], end=bounds[1])
+
+
+class TripQueries:
+    # `source` is a data directory of monthly files or a single local trip CSV
+    def __init__(self, source=catalog.DATA_DIR):
+        self.source = source
+        self._listing = None
+        self._partitions = []
+
+    def _scan(self):
+        if os.path.isfile(self.source):
+            return ((self.source, os.path.getmtime(self.source)),)
+        return tuple(sorted((e.name, e.stat().st_mtime) for e in os.scandir(self.source)))
+
+    def partitions(self):
+        # Re-scan only when the directory listing changed
+        listing = self._scan()
+        if listing != self._listing:
+            if os.path.isfile(self.source):
+                self._partitions = [describe_file(self.source)]
+            else:
+                self._partitions = catalog.discover(self.source)
+            self._listing = listing
+        return self._partitions
+
+    def resolve(self, members=None, date_range=None):
+        partitions = self.partitions()
+        if not partitions:
+            raise LookupError(f"no monthly Divvy trip files in {self.source}")
+        # Open-ended ranges run to the first or last available day
+        start, end = date_range or (None, None)
+        first_day, last_day = catalog.full_range(partitions)
+        date_range = (start or first_day, end or last_day)
+        selected = tuple(catalog.overlapping(partitions, date_range[0], date_range[1]))
+        if members is None:
+            members = ('casual', 'member')
+        return tuple(sorted(members)), tuple(date_range), selected
+
+    def version(self, selected):
+        return catalog.dataset_version(selected)
+
+    def _cube(self, members, date_range, selected):
+        return cube.slice_cube(cube.concat_cubes([partition_cube(p) for p in selected]),
+                               members, date_range)
+
+    def _durations(self, members, date_range, selected):
+        return durations.slice_summary(
+            durations.concat_summaries([partition_durations(p) for p in selected]), members, date_range)
+
+    # -------- Overview --------
+    def trip_counts(self, members=None, date_range=None):
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        counts = cube.rollup(self._cube(members, date_range, selected), ['member_casual'])
+        return _records(counts[['member_casual', 'count']])
+
+    def avg_duration(self, members=None, date_range=None):
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        avg = cube.rollup(self._cube(members, date_range, selected), ['member_casual'])
+        return _records(avg[['member_casual', 'mean_duration']])
+
+    def day_night(self, members=None, date_range=None):
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        split = cube.by_day_night(self._cube(members, date_range, selected))
+        return _records(split[['member_casual', 'is_daytime', 'count', 'mean_duration']])
+
+    # -------- Patterns --------
+    def weekly(self, members=None, date_range=None):
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        dow = cube.by_day_of_week(self._cube(members, date_range, selected))
+        return _records(dow[['day_of_week', 'member_casual', 'count']])
+
+    def hourly(self, members=None, date_range=None):
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        hourly = cube.by_hour(self._cube(members, date_range, selected))
+        return _records(hourly[['start_hour', 'member_casual', 'count', 'mean_duration']])
+
+    def hourly_stats(self, members=None, date_range=None):
+        # All selected user types combined, in the shape src/pages/Analytics.jsx reads
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        hourly = cube.rollup(self._cube(members, date_range, selected), ['start_hour'])
+        return [
+            {'hour': int(row.start_hour), 'tripCount': int(row.count),
+             'avgDuration': round(float(row.mean_duration) * 60, 1)}
+            for row in hourly.itertuples()
+        ]
+
+    # -------- Durations and Routes --------
+    def duration_box(self, members=None, date_range=None, max_minutes=180):
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        box = durations.box_stats(self._durations(members, date_range, selected),
+                                  ['time_of_day', 'member_casual'], max_minutes)
+        return _records(box)
+
+    def duration_histogram(self, members=None, date_range=None, max_minutes=120, width=4):
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        hist = durations.histogram(self._durations(members, date_range, selected),
+                                   ['member_casual'], max_minutes, width)
+        return _records(hist[['member_casual', 'bin_start', 'count']])
+
+    def top_routes(self, members=None, date_range=None, n=15):
+        members, date_range, selected = self.resolve(members, date_range)
+        if not selected:
+            return []
+        return _records(query_engine.top_routes(selected, members, date_range, n))
+
+    # -------- Map --------
+    def start_density(self, members=None, date_range=None, level='medium', endpoint='start'):
+        members, date_range, selected = self.resolve(members, date_range)
+        grid = spatial.concat_grids([partition_grid(p) for p in selected])
+        if grid.empty:
+            return []
+        return _records(spatial.density(grid, members, date_range, level, endpoint))
+
+    # -------- Data Quality --------
+    def quality(self, members=None, date_range=None):
+        # Ingest-time counters of the partitions overlapping the range (all user types)
+        members, date_range, selected = self.resolve(members, date_range)
+        return _records(quality.report([catalog.quality_counters(p) for p in selected]))
+
+    # -------- Station Flows --------
+    def station_flows(self, members=None, date_range=None, station=None):
+        # Bikes move whoever rides them, so flows always cover every user type
+        members, date_range, selected = self.resolve(members, date_range)
+        station_flows = flows.select_flows([partition_flows(p) for p in selected], date_range)
+        if station is None:
+            return _records(flows.summary(station_flows))
+        if station not in station_flows.stations:
+            raise KeyError(station)
+        return _records(flows.station_series(station_flows, station))
+
+    # -------- Demand Prediction --------
+    # The model covers every month and user type; the filters only key the API cache
+    def demand_forecast(self, members=None, date_range=None, hours=24, station=None):
+        model = demand_model(tuple(self.partitions()))
+        if station is None:
+            return _records(demand.citywide(model, hours))
+        if station not in model.stations:
+            raise KeyError(station)
+        return _records(demand.forecast(model, hours, stations=[station]).drop(columns='station'))
+
+    def demand_stations(self, members=None, date_range=None, hours=24, n=15):
+        return _records(demand.top_stations(demand_model(tuple(self.partitions())), hours, n=n))
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from catalog import concat_partitions
+
+# -----------------------
+# Reproducible Stratified Sample with Per-row Weights
+# -----------------------
+# Each trip gets a deterministic pseudo-random key from a seeded hash of its ride_id.
+# Within every (member_casual, date, hour) stratum the rows with the smallest keys are
+# kept (bottom-k), so the sample is identical across reruns, and samples of disjoint
+# batches merge into exactly the sample the combined data would produce. Batches must
+# not share trips: stratum sizes add, so a trip in two batches would be counted twice
+# (the catalog's partitions are disjoint; see ingest.retire_deltas).
+# `weight` is stratum size / rows kept, making weighted sums and means unbiased.
+SAMPLE_SEED = 20200401
+SAMPLE_PER_STRATUM = 3
+STRATA = ['member_casual', 'date', 'start_hour']
+
+
+def sample_keys(df, seed=SAMPLE_SEED):
+    return pd.util.hash_pandas_object(df['ride_id'], index=False,
+                                      hash_key=f"{seed:016d}"[-16:]).to_numpy()
+
+
+def _bottom_k(df, per_stratum):
+    df = df.sort_values(STRATA + ['sample_key'], kind='stable')
+    df = df[df.groupby(STRATA, observed=True).cumcount() < per_stratum]
+    kept = df.groupby(STRATA, observed=True)['sample_key'].transform('size')
+    df['weight'] = (df['stratum_rows'] / kept).astype('float64')
+    return df.sort_values(['started_at', 'sample_key'], kind='stable', ignore_index=True)
+
+
+def build_sample(df, per_stratum=SAMPLE_PER_STRATUM, seed=SAMPLE_SEED):
+    keyed = df.assign(date=df['started_at'].dt.normalize(), sample_key=sample_keys(df, seed))
+    keyed = keyed[keyed['date'].notna()]
+    keyed['stratum_rows'] = keyed.groupby(STRATA, observed=True)['sample_key'].transform('size')
+    return _bottom_k(keyed, per_stratum)
+
+
+def merge_samples(samples, per_stratum=SAMPLE_PER_STRATUM):
+    samples = [s for s in samples if len(s)]
+    if len(samples) <= 1:
+        return samples[0] if samples else pd.DataFrame()
+    # Stratum sizes add up across disjoint batches; then keep the overall bottom-k per stratum
+    sizes = pd.concat([s.groupby(STRATA, observed=True)['stratum_rows'].first() for s in samples])
+    sizes = sizes.groupby(level=STRATA, observed=True).sum().rename('stratum_rows').reset_index()
+    combined = concat_partitions(samples).drop(columns='stratum_rows')
+    combined = combined.merge(sizes, on=STRATA, how='left')
+    return _bottom_k(combined, per_stratum)
+
+
+# -----------------------
+# Weighted Estimators
+# -----------------------
+def weighted_counts(sample, by):
+    return sample.groupby(by, observed=True)['weight'].sum()
+
+
+def weighted_mean(sample, column, by):
+    valid = sample[sample[column].notna()]
+    sums = valid.assign(weighted=valid[column] * valid['weight'])\
+                .groupby(by, observed=True)[['weighted', 'weight']].sum()
+    return sums['weighted'] / sums['weight']
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+import quality
+from catalog import concat_partitions
+
+# -----------------------
+# Grid Binning of Trip Endpoints at Several Zoom Levels
+# -----------------------
+# Cell size in degrees per level; each trip endpoint is counted in one cell per level,
+# keyed by date and user type so the global filters can be applied to the bins.
+# Endpoints flagged off the map at ingest (missing or outside Chicago) are skipped.
+GRID_LEVELS = {
+    'coarse': 0.02,
+    'medium': 0.01,
+    'fine': 0.005,
+    'street': 0.0025,
+}
+ENDPOINTS = {
+    'start': ('start_lat', 'start_lng'),
+    'end': ('end_lat', 'end_lng'),
+}
+GRID_KEYS = ['endpoint', 'level', 'cell_y', 'cell_x', 'date', 'member_casual']
+
+
+def build_grids(df, levels=GRID_LEVELS, endpoints=ENDPOINTS):
+    date = df['started_at'].dt.normalize()
+    grids = []
+    for endpoint, (lat_col, lng_col) in endpoints.items():
+        lat = df[lat_col].to_numpy(dtype='float64')
+        lng = df[lng_col].to_numpy(dtype='float64')
+        valid = quality.valid(df['quality'], quality.OFF_MAP[endpoint]) & date.notna().to_numpy()
+        for level, size in levels.items():
+            binned = pd.DataFrame({
+                'cell_y': np.floor(lat[valid] / size).astype('int32'),
+                'cell_x': np.floor(lng[valid] / size).astype('int32'),
+                'date': date[valid].to_numpy(),
+                'member_casual': df['member_casual'][valid].to_numpy(),
+            })
+            counts = binned.groupby(['cell_y', 'cell_x', 'date', 'member_casual'], observed=True)\
+                           .size().reset_index(name='count')
+            counts.insert(0, 'level', level)
+            counts.insert(0, 'endpoint', endpoint)
+            grids.append(counts)
+    grid = pd.concat(grids, ignore_index=True)
+    grid['endpoint'] = grid['endpoint'].astype('category')
+    grid['level'] = grid['level'].astype('category')
+    grid['member_casual'] = grid['member_casual'].astype('category')
+    return grid
+
+
+def concat_grids(grids):
+    combined = concat_partitions(grids)
+    if combined.empty:
+        return combined
+    return combined.groupby(GRID_KEYS, observed=True, as_index=False)['count'].sum()
+
+
+def density(grid, members, date_range, level='medium', endpoint='start'):
+    # One row per non-empty cell with its centre coordinates and trip count
+    size = GRID_LEVELS[level]
+    cells = grid[
+        (grid['endpoint'] == endpoint) &
+        (grid['level'] == level) &
+        (grid['member_casual'].isin(members)) &
+        (grid['date'] >= pd.Timestamp(date_range[0])) &
+        (grid['date'] <= pd.Timestamp(date_range[1]))
+    ]
+    cells = cells.groupby(['cell_y', 'cell_x'], as_index=False)['count'].sum()
+    cells['lat'] = (cells['cell_y'] + 0.5) * size
+    cells['lon'] = (cells['cell_x'] + 0.5) * size
+    return cells[['lat', 'lon', 'count']]
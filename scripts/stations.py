@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import quality
+
+# -----------------------
+# Station Dimension Table and Origin-Destination Matrix
+# -----------------------
+# Stations get compact int32 ids (position in the table, -1 for a missing station).
+# Station names stay categorical on the trip frame, so encoding only maps the
+# category codes and never touches per-trip strings.
+
+
+@dataclass(frozen=True)
+class StationIndex:
+    stations: pd.DataFrame   # station_id -> name, lat, lng
+    start_ids: np.ndarray    # per-trip int32 station id
+    end_ids: np.ndarray
+
+
+def _encode(column, names):
+    mapping = names.get_indexer(column.cat.categories).astype('int32')
+    codes = column.cat.codes.to_numpy()
+    return np.where(codes >= 0, mapping[codes], -1).astype('int32')
+
+
+def _mean_coords(ids, lat, lng, n):
+    valid = (ids >= 0) & ~np.isnan(lat) & ~np.isnan(lng)
+    counts = np.bincount(ids[valid], minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.bincount(ids[valid], weights=lat[valid], minlength=n) / counts,
+                np.bincount(ids[valid], weights=lng[valid], minlength=n) / counts,
+                counts)
+
+
+def build_station_index(df):
+    names = df['start_station_name'].cat.categories\
+              .union(df['end_station_name'].cat.categories)
+    start_ids = _encode(df['start_station_name'], names)
+    end_ids = _encode(df['end_station_name'], names)
+    n = len(names)
+    # Coordinates flagged off the map at ingest do not pull the station location
+    on_map = {end: quality.valid(df['quality'], bit) for end, bit in quality.OFF_MAP.items()}
+    s_lat, s_lng, s_n = _mean_coords(np.where(on_map['start'], start_ids, -1), df['start_lat'].to_numpy('float64'),
+                                     df['start_lng'].to_numpy('float64'), n)
+    e_lat, e_lng, e_n = _mean_coords(np.where(on_map['end'], end_ids, -1), df['end_lat'].to_numpy('float64'),
+                                     df['end_lng'].to_numpy('float64'), n)
+    total = s_n + e_n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lat = (np.nan_to_num(s_lat) * s_n + np.nan_to_num(e_lat) * e_n) / total
+        lng = (np.nan_to_num(s_lng) * s_n + np.nan_to_num(e_lng) * e_n) / total
+    stations = pd.DataFrame({'name': names, 'lat': lat, 'lng': lng, 'trips': total})
+    stations.index.name = 'station_id'
+    return StationIndex(stations=stations, start_ids=start_ids, end_ids=end_ids)
+
+
+def merge_station_indexes(indexes, order=None):
+    # Union the station tables and remap each batch's ids; `order` is the permutation
+    # catalog.merge_order applied to the concatenated trips, if any
+    indexes = [ix for ix in indexes if len(ix.start_ids) or len(ix.stations)]
+    if len(indexes) == 1 and order is None:
+        return indexes[0]
+    names = pd.Index([])
+    for ix in indexes:
+        names = names.union(pd.Index(ix.stations['name']))
+    n = len(names)
+    lat_sum, lng_sum, trips = np.zeros(n), np.zeros(n), np.zeros(n, dtype='int64')
+    start_ids, end_ids = [], []
+    for ix in indexes:
+        mapping = names.get_indexer(ix.stations['name']).astype('int32')
+        start_ids.append(np.where(ix.start_ids >= 0, mapping[ix.start_ids], -1).astype('int32'))
+        end_ids.append(np.where(ix.end_ids >= 0, mapping[ix.end_ids], -1).astype('int32'))
+        counts = ix.stations['trips'].to_numpy()
+        np.add.at(lat_sum, mapping, np.nan_to_num(ix.stations['lat'].to_numpy()) * counts)
+        np.add.at(lng_sum, mapping, np.nan_to_num(ix.stations['lng'].to_numpy()) * counts)
+        np.add.at(trips, mapping, counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stations = pd.DataFrame({'name': names, 'lat': lat_sum / trips, 'lng': lng_sum / trips,
+                                 'trips': trips})
+    stations.index.name = 'station_id'
+    start_ids = np.concatenate(start_ids) if start_ids else np.array([], dtype='int32')
+    end_ids = np.concatenate(end_ids) if end_ids else np.array([], dtype='int32')
+    if order is not None:
+        start_ids, end_ids = start_ids[order], end_ids[order]
+    return StationIndex(stations=stations, start_ids=start_ids, end_ids=end_ids)
+
+
+def od_matrix(index, rows=slice(None), weights=None):
+    # Sparse origin x destination trip counts for the selected trip rows
+    start = index.start_ids[rows]
+    end = index.end_ids[rows]
+    valid = (start >= 0) & (end >= 0)
+    data = np.ones(valid.sum(), dtype='int64') if weights is None else np.asarray(weights)[valid]
+    n = len(index.stations)
+    return sparse.coo_matrix((data, (start[valid], end[valid])), shape=(n, n)).tocsr()
+
+
+def merge_od(parts):
+    # Sum (od, stations) pairs of separate batches over the union of their station names
+    names = pd.Index([])
+    for _, table in parts:
+        names = names.union(pd.Index(table['name']))
+    rows, cols, data = [], [], []
+    for od, table in parts:
+        mapping = names.get_indexer(table['name'])
+        coo = od.tocoo()
+        rows.append(mapping[coo.row])
+        cols.append(mapping[coo.col])
+        data.append(coo.data)
+    n = len(names)
+    if not parts:
+        return sparse.csr_matrix((n, n), dtype='int64'), pd.DataFrame({'name': names})
+    od = sparse.coo_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(n, n)).tocsr()
+    return od, pd.DataFrame({'name': names})
+
+
+def top_routes(od, stations, n=15):
+    coo = od.tocoo()
+    n = min(n, coo.nnz)
+    if n == 0:
+        return pd.DataFrame(columns=['start_station_name', 'end_station_name', 'count', 'route'])
+    top = np.argpartition(-coo.data, n - 1)[:n]
+    top = top[np.argsort(-coo.data[top], kind='stable')]
+    routes = pd.DataFrame({
+        'start_station_name': stations['name'].to_numpy()[coo.row[top]],
+        'end_station_name': stations['name'].to_numpy()[coo.col[top]],
+        'count': coo.data[top],
+    })
+    # Labels are built only for the rows actually displayed
+    routes['route'] = routes['start_station_name'] + " → " + routes['end_station_name']
+    return routes
+
@@ -0,0 +1,109 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import catalog
+import flows
+
+# -----------------------
+# Shared Dataset Store and Per-session Memory Budget
+# -----------------------
+# Trip frames are loaded once per process (the dashboards hold them with
+# st.cache_resource, which hands every session the same object). With
+# DIVVY_SHARED_DIR set, e.g. to /dev/shm/divvy, each partition is also exported
+# once per node as an uncompressed Arrow file and memory-mapped, so numeric
+# columns are backed by page-cache pages every process on the node shares.
+# Shared frames are read-only; sessions select from them with row positions or
+# slices (copy-on-write keeps any derived frame from touching the shared one).
+SHARED_DIR = os.environ.get('DIVVY_SHARED_DIR')
+SESSION_BUDGET_MB = int(os.environ.get('DIVVY_SESSION_BUDGET_MB', 256))
+# Per-partition objects are cached for the life of the process (one entry per file);
+# aggregates combined for a date range are kept for this many selections at most
+SELECTION_CACHE_ENTRIES = int(os.environ.get('DIVVY_SELECTION_CACHE_ENTRIES', 8))
+# Dense station x 15-minute flow arrays are the largest per-partition objects (tens of
+# MB a month), so only the most recently used months are kept
+FLOW_CACHE_ENTRIES = int(os.environ.get('DIVVY_FLOW_CACHE_ENTRIES', 12))
+
+
+class MemoryBudgetExceeded(MemoryError):
+    pass
+
+
+def arrow_path_for(partition, shared_dir):
+    # The dataset version in the name makes a rewritten or grown CSV a new file
+    return os.path.join(shared_dir, f"{partition.name}-{catalog.dataset_version([partition])}.arrow")
+
+
+def export_arrow(partition, shared_dir):
+    os.makedirs(shared_dir, exist_ok=True)
+    path = arrow_path_for(partition, shared_dir)
+    table = pa.Table.from_pandas(catalog.load_partition(partition), preserve_index=False)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    for old in glob.glob(os.path.join(shared_dir, f"{partition.name}-*.arrow")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                # Still mapped by another process; it is removed on the next export
+                pass
+    return path
+
+
+def load_shared(partition, shared_dir=SHARED_DIR):
+    if not shared_dir:
+        return catalog.load_partition(partition)
+    path = arrow_path_for(partition, shared_dir)
+    if not os.path.exists(path):
+        try:
+            path = export_arrow(partition, shared_dir)
+        except OSError:
+            return catalog.load_partition(partition)
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    # split_blocks keeps one block per column so null-free numeric columns stay zero-copy
+    return table.to_pandas(split_blocks=True)
+
+
+def nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=False).sum())
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return int(value.nbytes)
+    if isinstance(value, flows.StationFlows):
+        # Slices of a cached partition's arrays are views; only combined arrays are new
+        return sum(int(a.nbytes) for a in (value.arrivals, value.departures) if a.base is None)
+    # Slices and other lazy selectors allocate nothing per row
+    return 0
+
+
+class SessionBudget:
+    # Bytes materialised by one session's rerun; shared frames and caches are not charged
+    def __init__(self, limit_mb=SESSION_BUDGET_MB):
+        self.limit = limit_mb * 2 ** 20
+        self.charges = {}
+
+    @property
+    def used(self):
+        return sum(self.charges.values())
+
+    def charge(self, name, value):
+        size = nbytes(value)
+        if self.used + size > self.limit:
+            raise MemoryBudgetExceeded(
+                f"{name} needs {size / 2 ** 20:.1f} MB; session budget is {self.limit / 2 ** 20:.0f} MB "
+                f"with {self.used / 2 ** 20:.1f} MB in use. Narrow the date range or user types.")
+        self.charges[name] = size
+        return value
+
+    def report(self):
+        return {
+            'budget_mb': round(self.limit / 2 ** 20, 1),
+            'used_mb': round(self.used / 2 ** 20, 2),
+            'items_mb': {name: round(size / 2 ** 20, 2) for name, size in self.charges.items()},
+        }
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The scripts are flat sibling modules; run with: python -m pytest scripts/tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+import ingest
+
+MONTHS = [(2020, 4), (2020, 5), (2020, 6)]
+ROWS_PER_MONTH = 2000
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    # Three small synthetic months in the Divvy schema, CSVs only (not yet ingested)
+    for year, month in MONTHS:
+        benchmark.synth_trips(ROWS_PER_MONTH, year, month).to_csv(
+            tmp_path / ingest.MONTH_FILE.format(year=year, month=month), index=False)
+    return tmp_path
@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('httpx')
+from fastapi.testclient import TestClient
+
+import api
+from queries import TripQueries
+
+
+@pytest.fixture
+def client(data_dir, monkeypatch):
+    monkeypatch.setattr(api, 'queries', TripQueries(str(data_dir)))
+    monkeypatch.setattr(api, 'responses', api.LRUCache(api.RESPONSE_CACHE_SIZE))
+    return TestClient(api.app)
+
+
+def test_etag_matches_parsed_tags():
+    etag = '"0123456789abcdef"'
+    assert api.etag_matches(etag, etag)
+    assert api.etag_matches(f'"other", {etag}', etag)
+    assert api.etag_matches(f'W/{etag}', etag)
+    assert api.etag_matches('*', etag)
+    assert not api.etag_matches(None, etag)
+    assert not api.etag_matches('', etag)
+    # Substrings and unquoted values are different tags
+    assert not api.etag_matches(f'"x{etag[1:]}', etag)
+    assert not api.etag_matches(f'"{etag}"', etag)
+    assert not api.etag_matches(etag.strip('"'), etag)
+
+
+def test_if_none_match_revalidates(client):
+    first = client.get('/api/hourly-stats')
+    assert first.status_code == 200
+    etag = first.headers['etag']
+
+    assert client.get('/api/hourly-stats', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/hourly-stats', headers={'If-None-Match': f'"stale", {etag}'}).status_code == 304
+    # A header that merely contains the tag is not a match
+    wrapped = client.get('/api/hourly-stats', headers={'If-None-Match': f'"{etag}"'})
+    assert wrapped.status_code == 200
+    assert wrapped.content == first.content
+
+
+def test_etag_changes_with_parameters(client):
+    all_members = client.get('/api/trip-counts').headers['etag']
+    members_only = client.get('/api/trip-counts?members=member').headers['etag']
+    assert all_members != members_only
+    assert client.get('/api/trip-counts?members=member',
+                      headers={'If-None-Match': all_members}).status_code == 200
+
+
+@pytest.mark.parametrize('path', ['trip-counts', 'avg-duration', 'day-night', 'weekly', 'hourly', 'hourly-stats',
+                                  'duration-histogram', 'duration-box', 'top-routes', 'density', 'flows'])
+def test_range_without_data_is_empty(client, path):
+    response = client.get(f'/api/{path}?start=2030-01-01&end=2030-01-31')
+    assert response.status_code == 200
+    assert response.json() == []
@@ -0,0 +1,82 @@
+from datetime import date
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import benchmark
+import catalog
+import filters
+import ingest
+import queries
+
+
+def test_discover_only_stats_files(data_dir):
+    partitions = catalog.discover(str(data_dir))
+    assert [p.name for p in partitions] == ['202004', '202005', '202006']
+    assert not list(data_dir.glob('*.parquet'))
+    # Loading a month ingests that month alone, and its identity does not change
+    assert len(catalog.load_partition(partitions[1])) == 2000
+    assert [p.name for p in data_dir.glob('*.parquet')] == ['202005-divvy-tripdata.parquet']
+    assert catalog.discover(str(data_dir)) == partitions
+
+
+def test_read_only_directory_falls_back_to_csv(data_dir, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise PermissionError(13, 'Read-only file system')
+    monkeypatch.setattr(ingest, 'write_parquet', read_only)
+
+    partitions = catalog.discover(str(data_dir))
+    df = catalog.load_partition(partitions[0])
+    assert len(df) == 2000
+    assert 'quality' in df.columns
+    assert catalog.quality_counters(partitions[0])['rows'] == 2000
+    assert catalog.partition_rows(partitions[0]) is None
+    assert not list(data_dir.glob('*.parquet'))
+
+
+def test_concat_out_of_order_months_builds_an_index(data_dir):
+    april, may, june = [catalog.load_partition(p) for p in catalog.discover(str(data_dir))]
+    df = catalog.concat_trips([june, april, may])
+    index = filters.build_index(df)
+    rows = filters.filter_rows(index, ['casual', 'member'], (date(2020, 4, 1), date(2020, 4, 30)))
+    assert sorted(df['ride_id'].iloc[rows]) == sorted(april['ride_id'])
+
+
+def test_append_writes_only_new_rides(data_dir, tmp_path_factory):
+    incoming = tmp_path_factory.mktemp('incoming')
+    july = benchmark.synth_trips(2500, 2020, 7)
+    july.iloc[:1000].to_csv(incoming / 'first.csv', index=False)
+    july.iloc[500:2000].to_csv(incoming / 'second.csv', index=False)
+
+    first, _ = ingest.append_csv(str(incoming / 'first.csv'), str(data_dir))
+    second, _ = ingest.append_csv(str(incoming / 'second.csv'), str(data_dir))
+    assert [rows for _, rows in first] == [1000]
+    assert [rows for _, rows in second] == [1000]
+    again, _ = ingest.append_csv(str(incoming / 'second.csv'), str(data_dir))
+    assert again == []
+
+    segments = [p for p in catalog.discover(str(data_dir)) if p.segment]
+    assert len(segments) == 2
+    ride_ids = pd.concat([catalog.load_partition(p)['ride_id'] for p in segments])
+    assert ride_ids.is_unique and len(ride_ids) == 2000
+
+
+def test_full_month_retires_appended_duplicates(data_dir, tmp_path_factory):
+    incoming = tmp_path_factory.mktemp('incoming')
+    july = benchmark.synth_trips(2500, 2020, 7)
+    july.iloc[:1000].to_csv(incoming / 'first.csv', index=False)
+    july.iloc[1000:1500].to_csv(incoming / 'second.csv', index=False)
+    ingest.append_csv(str(incoming / 'first.csv'), str(data_dir))
+    ingest.append_csv(str(incoming / 'second.csv'), str(data_dir))
+    # The full monthly CSV lands after the deltas and repeats all of their rides
+    july.to_csv(data_dir / ingest.MONTH_FILE.format(year=2020, month=7), index=False)
+
+    counts = queries.TripQueries(str(data_dir)).trip_counts(date_range=(date(2020, 7, 1), date(2020, 7, 31)))
+    expected = july[july['member_casual'].isin(['casual', 'member'])]
+    assert sum(r['count'] for r in counts) == len(expected)
+
+    partitions = [p for p in catalog.discover(str(data_dir)) if p.name.startswith('202007')]
+    # Fully covered segments are kept as empty files, which the catalog skips
+    assert [p.segment for p in partitions] == [0]
+    assert all(pq.read_metadata(path).num_rows == 0
+               for path in ingest.delta_paths(str(data_dir / ingest.MONTH_FILE.format(year=2020, month=7))))
@@ -0,0 +1,84 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog
+import cube
+import durations
+import engine
+import spatial
+
+
+@pytest.fixture
+def engines():
+    pytest.importorskip('duckdb')
+    return engine.PandasEngine(), engine.DuckDBEngine()
+
+
+def _frame(df, keys):
+    # Row order, index and dtypes (categorical vs object, int widths) differ by engine
+    df = df.astype({c: 'object' for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def _assert_same(actual, expected, keys):
+    pd.testing.assert_frame_equal(_frame(actual, keys), _frame(expected, keys)[list(actual.columns)],
+                                  check_dtype=False)
+
+
+def test_partition_aggregates_match(data_dir, engines):
+    pandas_engine, duckdb_engine = engines
+    for partition in catalog.discover(str(data_dir)):
+        _assert_same(duckdb_engine.cube(partition), pandas_engine.cube(partition), cube.CUBE_KEYS)
+        _assert_same(duckdb_engine.durations(partition), pandas_engine.durations(partition),
+                     durations.SUMMARY_KEYS)
+        _assert_same(duckdb_engine.grid(partition), pandas_engine.grid(partition), spatial.GRID_KEYS)
+        _assert_same(duckdb_engine.sample(partition), pandas_engine.sample(partition), ['ride_id'])
+
+
+def test_demand_and_flows_match(data_dir, engines):
+    pandas_engine, duckdb_engine = engines
+    for partition in catalog.discover(str(data_dir)):
+        expected, actual = pandas_engine.demand(partition), duckdb_engine.demand(partition)
+        rows = expected.stations.get_indexer(actual.stations)
+        assert (rows >= 0).all() and expected.starts[rows].sum() == expected.starts.sum()
+        np.testing.assert_array_equal(actual.starts, expected.starts[rows])
+        np.testing.assert_array_equal(actual.starts_sq, expected.starts_sq[rows])
+        np.testing.assert_array_equal(actual.days, expected.days)
+
+        expected, actual = pandas_engine.flows(partition), duckdb_engine.flows(partition)
+        rows = expected.stations.get_indexer(actual.stations)
+        assert (rows >= 0).all() and actual.first == expected.first
+        np.testing.assert_array_equal(actual.departures, expected.departures[rows])
+        np.testing.assert_array_equal(actual.arrivals, expected.arrivals[rows])
+
+
+@pytest.mark.parametrize('members', [('casual', 'member'), ('member',)])
+def test_top_routes_match(data_dir, engines, members):
+    pandas_engine, duckdb_engine = engines
+    partitions = catalog.discover(str(data_dir))
+    # A range that crosses a month boundary, so both engines combine partitions
+    date_range = (date(2020, 4, 20), date(2020, 5, 10))
+    selected = catalog.overlapping(partitions, *date_range)
+    expected = pandas_engine.top_routes(selected, members, date_range, n=10)
+    actual = duckdb_engine.top_routes(selected, members, date_range, n=10)
+    assert len(actual) and len(actual) == len(expected)
+    # Ties at the cut-off may pick different routes; the counts must agree
+    assert actual['count'].tolist() == expected['count'].tolist()
+    top = actual.merge(expected, on=['start_station_name', 'end_station_name'], suffixes=('', '_pandas'))
+    assert (top['count'] == top['count_pandas']).all()
+
+
+def test_demand_reads_only_its_columns(data_dir, monkeypatch):
+    def full_frame(partition):
+        raise AssertionError("demand loaded a full partition")
+    pandas_engine = engine.PandasEngine(frames=full_frame)
+    loaded = []
+    load_partition = catalog.load_partition
+    monkeypatch.setattr(catalog, 'load_partition',
+                        lambda partition, columns=None: loaded.append(columns) or load_partition(partition, columns))
+    stats = [pandas_engine.demand(p) for p in catalog.discover(str(data_dir))]
+    assert loaded == [['started_at', 'start_station_name']] * 3
+    assert sum(s.starts.sum() for s in stats) > 0
@@ -0,0 +1,39 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+import ingest
+import quality
+
+
+def _read(path):
+    df = pq.read_table(path).to_pandas()
+    # Dictionary order depends on how chunks were unified; compare the values
+    return df.astype({c: 'object' for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+
+
+def test_chunked_ingest_matches_in_memory(data_dir, tmp_path):
+    csv_path = str(data_dir / '202005-divvy-tripdata.csv')
+    # Unparseable start times sort first in both paths
+    trips = pd.read_csv(csv_path)
+    trips.loc[[5, 1500], 'started_at'] = 'not a time'
+    trips.to_csv(csv_path, index=False)
+    whole = ingest.ingest_csv(csv_path, str(tmp_path / 'whole.parquet'))
+    # Several chunks, the last one partial, and row groups that span chunk boundaries
+    chunked = ingest.ingest_csv_chunked(csv_path, str(tmp_path / 'chunked.parquet'), chunk_rows=300)
+
+    expected, actual = _read(whole), _read(chunked)
+    assert list(actual.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(actual, expected)
+    assert actual['started_at'].iloc[:2].isna().all()
+    assert actual['started_at'].iloc[2:].is_monotonic_increasing
+    assert (quality.decode_counters(pq.read_schema(chunked).metadata)
+            == quality.decode_counters(pq.read_schema(whole).metadata))
+    assert not list(tmp_path.glob('*.arrow'))
+
+
+def test_chunked_ingest_of_header_only_file(tmp_path):
+    csv_path = tmp_path / '202007-divvy-tripdata.csv'
+    csv_path.write_text(','.join(ingest.CSV_DTYPES) + ',started_at,ended_at\n')
+    path = ingest.ingest_csv_chunked(str(csv_path), chunk_rows=100)
+    assert pq.read_metadata(path).num_rows == 0
+    assert quality.decode_counters(pq.read_schema(path).metadata)['rows'] == 0
@@ -0,0 +1,25 @@
+from datetime import date
+
+import benchmark
+import ingest
+from queries import TripQueries
+
+
+def test_local_file_spans_its_trips(tmp_path, monkeypatch):
+    trips = benchmark.synth_trips(500, 2020, 4)
+    trips.to_csv(tmp_path / 'sample.csv', index=False)
+    queries = TripQueries(str(tmp_path / 'sample.csv'))
+
+    partition, = queries.partitions()
+    assert partition.name == 'sample'
+    assert (partition.start, partition.end) == (date(2020, 4, 1), date(2020, 4, 30))
+    counts = queries.trip_counts()
+    assert sum(r['count'] for r in counts) == trips['member_casual'].isin(['casual', 'member']).sum()
+
+    # A read-only directory reads the range from the CSV instead
+    def read_only(*args, **kwargs):
+        raise PermissionError(13, 'Read-only file system')
+    monkeypatch.setattr(ingest, 'write_parquet', read_only)
+    trips.to_csv(tmp_path / 'copy.csv', index=False)
+    partition, = TripQueries(str(tmp_path / 'copy.csv')).partitions()
+    assert (partition.start, partition.end) == (date(2020, 4, 1), date(2020, 4, 30))
@@ -0,0 +1,14 @@
+// Static aggregate bundles written by scripts/bundles.py into bundles/ at the site root
+const BUNDLE_URL = 'bundles/';
+
+export function fetchBundle(path) {
+  return fetch(BUNDLE_URL + path).then(r => {
+    if (!r.ok) throw new Error(`${path}: ${r.status}`);
+    return r.json();
+  });
+}
+
+export function latestMonth(manifest) {
+  if (!manifest.months || !manifest.months.length) throw new Error('the bundle has no months');
+  return manifest.months[manifest.months.length - 1];
+}
@@ -1,23 +1,39 @@
 import React, { useEffect, useState } from 'react';
+import { Alert } from 'antd';
 import {
   ResponsiveContainer, LineChart, Line,
   XAxis, YAxis, CartesianGrid, Tooltip, Legend,
   BarChart, Bar
 } from 'recharts';
+import { fetchBundle, latestMonth } from '../bundles';
 
 export default function Analytics() {
   const [data, setData] = useState([]);
+  const [error, setError] = useState(null);
 
   useEffect(() => {
-    // In a real app, replace with an actual endpoint or local computation
-    fetch('/api/hourly-stats')
-      .then(r => r.json())
-      .then(setData);
+    // Exact hourly aggregates of the latest month from the static bundles (scripts/bundles.py)
+    fetchBundle('manifest.json')
+      .then(m => fetchBundle(latestMonth(m).hourly))
+      .then(h => {
+        // Mean durations cover only valid durations, so they weigh by duration_count
+        const byHour = Array.from({ length: 24 }, (_, hour) => ({ hour, tripCount: 0, totalDuration: 0, timed: 0 }));
+        h.hour.forEach((hour, i) => {
+          byHour[hour].tripCount += h.trips[i];
+          byHour[hour].totalDuration += h.avg_duration_s[i] * h.duration_count[i];
+          byHour[hour].timed += h.duration_count[i];
+        });
+        setData(byHour.map(({ hour, tripCount, totalDuration, timed }) => ({
+          hour, tripCount, avgDuration: timed ? Math.round(totalDuration / timed) : 0
+        })));
+      })
+      .catch(e => setError(e.message));
   }, []);
 
   return (
     <>
       <h2>Hourly Analytics</h2>
+      {error && <Alert type="error" showIcon message="Could not load the trip bundles" description={error} />}
       <ResponsiveContainer width="100%" height={300}>
         <LineChart data={data}>
           <CartesianGrid strokeDasharray="3 3" />
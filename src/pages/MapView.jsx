@@ -1,20 +1,40 @@
 import React, { useEffect, useState } from 'react';
-import { MapContainer, TileLayer } from 'react-leaflet';
-import AnimatedMarker from 'react-leaflet-animated-marker';
+import { Alert } from 'antd';
+import { MapContainer, TileLayer, CircleMarker, Tooltip } from 'react-leaflet';
 import 'leaflet/dist/leaflet.css';
+import { fetchBundle, latestMonth } from '../bundles';
 
 export default function MapView() {
-  const [trips, setTrips] = useState([]);
+  const [cells, setCells] = useState([]);
+  const [error, setError] = useState(null);
 
   useEffect(() => {
-    fetch('https://data.cityofchicago.org/resource/fg6s-gzvg.json?$limit=1000')
-      .then(r => r.json())
-      .then(d => setTrips(d.filter(t => t.from_latitude && t.to_latitude)));
+    // Start-location density of every trip in the latest month, from the static bundles
+    fetchBundle('manifest.json')
+      .then(m => {
+        const month = latestMonth(m);
+        return Promise.all(month.shards.map(s => fetchBundle(s.density)))
+          .then(shards => {
+            const trips = {};
+            shards.forEach(d => d.y.forEach((y, i) => {
+              const key = `${y},${d.x[i]}`;
+              trips[key] = (trips[key] || 0) + d.trips[i];
+            }));
+            const max = Math.max(1, ...Object.values(trips));
+            setCells(Object.entries(trips).map(([key, count]) => {
+              const [y, x] = key.split(',').map(Number);
+              return { key, count, radius: 3 + 12 * Math.sqrt(count / max),
+                       center: [(y + 0.5) * m.grid.cell, (x + 0.5) * m.grid.cell] };
+            }));
+          });
+      })
+      .catch(e => setError(e.message));
   }, []);
 
   return (
     <>
-      <h2>Live Map of Trips</h2>
+      <h2>Map of Trip Starts</h2>
+      {error && <Alert type="error" showIcon message="Could not load the trip bundles" description={error} />}
       <MapContainer
         center={[41.8781, -87.6298]}
         zoom={12}
@@ -24,19 +44,15 @@ export default function MapView() {
           url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
           attribution="&copy; OpenStreetMap contributors"
         />
-        {trips.map(t => (
-          <AnimatedMarker
-            key={t.trip_id}
-            positions={[
-              [t.from_latitude, t.from_longitude],
-              [t.to_latitude, t.to_longitude]
-            ]}
-            duration={t.trip_duration * 1000}
-            icon={{
-              iconUrl: 'https://cdn-icons-png.flaticon.com/512/684/684908.png',
-              iconSize: [32,32]
-            }}
-          />
+        {cells.map(c => (
+          <CircleMarker
+            key={c.key}
+            center={c.center}
+            radius={c.radius}
+            pathOptions={{ stroke: false, fillOpacity: 0.5 }}
+          >
+            <Tooltip>{c.count.toLocaleString()} trips</Tooltip>
+          </CircleMarker>
         ))}
       </MapContainer>
     </>